@@ -6,7 +6,7 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Dict, Iterator
 import os
 
 
@@ -94,6 +94,31 @@ class SourceDatabase:
             )
             return [self._row_to_record(row) for row in result]
 
+    def iter_links(self, table_name: str = None, batch_size: int = 1000) -> Iterator[LinkRecord]:
+        """
+        流式遍历links记录（服务端游标分批拉取，不一次性载入内存）
+
+        Args:
+            table_name: 类型名，None 时与 get_all_links 相同（graduate/undergraduate）
+            batch_size: 每批从服务端拉取的行数
+
+        Yields:
+            LinkRecord
+        """
+        self.connect()
+        if table_name:
+            sql = "SELECT * FROM links WHERE table_name = :table_name ORDER BY id"
+            params = {"table_name": table_name}
+        else:
+            sql = "SELECT * FROM links WHERE table_name IN ('graduate', 'undergraduate') ORDER BY id"
+            params = {}
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                text(sql), params
+            )
+            for row in result:
+                yield self._row_to_record(row)
+
     def get_school_name(self, table_name: str, row_id: int) -> Optional[str]:
         """
         根据 table_name 和 row_id 获取学校名称
@@ -117,6 +142,28 @@ class SourceDatabase:
             row = result.fetchone()
             return row[0] if row else None
 
+    def get_school_names(self, table_name: str, row_ids: List[int]) -> Dict[int, str]:
+        """
+        批量获取学校名称 (一次查询)
+
+        Args:
+            table_name: 表名 (graduate/undergraduate)
+            row_ids: 该表中的记录ID列表
+
+        Returns:
+            {row_id: 学校名称}，无法获取的 row_id 不在结果中
+        """
+        if table_name not in ('graduate', 'undergraduate') or not row_ids:
+            return {}
+
+        self.connect()
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text(f"SELECT id, school FROM {table_name} WHERE id = ANY(:row_ids)"),
+                {"row_ids": list(row_ids)}
+            )
+            return {row[0]: row[1] for row in result if row[1]}
+
     def get_links_by_type(self, table_name: str) -> List[LinkRecord]:
         """
         按类型筛选links
@@ -8,7 +8,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError, DisconnectionError
 from sqlalchemy.pool import NullPool
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from functools import wraps
 import hashlib
@@ -221,6 +221,55 @@ class TargetDatabase:
             conn.commit()
             return result.scalar()
 
+    @with_retry(max_retries=3, delay=1)
+    def batch_create_tasks(self, tasks: List[Tuple[int, str, Optional[str]]]) -> Dict[int, int]:
+        """
+        批量创建爬取任务 (一条 INSERT ... RETURNING)
+
+        Args:
+            tasks: (source_link_id, source_url, school_name) 列表
+
+        Returns:
+            {source_link_id: task_id}
+        """
+        # 同一条 INSERT 中 source_link_id 不能重复，后出现的覆盖先出现的
+        rows = {source_link_id: (source_url, school_name)
+                for source_link_id, source_url, school_name in tasks}
+        if not rows:
+            return {}
+
+        self.connect()
+        ids = list(rows.keys())
+        urls = [rows[i][0] for i in ids]
+
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text("""
+                    INSERT INTO crawl_tasks (source_link_id, source_url, url_hash, school_name, status)
+                    SELECT s.source_link_id, s.source_url, s.url_hash, s.school_name, 'pending'
+                    FROM unnest(
+                        CAST(:ids AS integer[]), CAST(:urls AS text[]),
+                        CAST(:hashes AS text[]), CAST(:schools AS text[])
+                    ) AS s(source_link_id, source_url, url_hash, school_name)
+                    ON CONFLICT (source_link_id) DO UPDATE SET
+                        source_url = EXCLUDED.source_url,
+                        url_hash = EXCLUDED.url_hash,
+                        school_name = EXCLUDED.school_name,
+                        status = 'pending',
+                        updated_at = NOW()
+                    RETURNING source_link_id, id
+                """),
+                {
+                    "ids": ids,
+                    "urls": urls,
+                    "hashes": [hashlib.md5(url.encode()).hexdigest() for url in urls],
+                    "schools": [rows[i][1] for i in ids],
+                }
+            )
+            task_ids = {row[0]: row[1] for row in result}
+            conn.commit()
+            return task_ids
+
     @with_retry(max_retries=3, delay=1)
     def update_task_status(self, task_id: int, status: str, **kwargs):
         """
@@ -345,6 +394,16 @@ class TargetDatabase:
                 ))
             return tasks
 
+    def count_tasks_by_status(self, status: str) -> int:
+        """统计指定状态的任务数（数据库端 COUNT，不拉取行数据）"""
+        self.connect()
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text("SELECT COUNT(*) FROM crawl_tasks WHERE status = :status"),
+                {"status": status}
+            )
+            return result.scalar()
+
     def get_changed_tasks(self, url_hashes: Dict[int, str]) -> List[int]:
         """
         检测URL变更的任务 (批量查询优化版)
@@ -376,6 +435,40 @@ class TargetDatabase:
 
         return changed_ids
 
+    @with_retry(max_retries=3, delay=1)
+    def diff_against_source(self, url_hashes: Dict[int, str]) -> Tuple[List[int], List[int]]:
+        """
+        一次查询比对源链接与已有任务，区分新增和 URL 变更
+
+        源链接以 (id, url_hash) 数组传入，在数据库端 LEFT JOIN crawl_tasks，
+        只返回需要处理的行，不再把整张任务表拉到本地比较
+
+        Args:
+            url_hashes: {source_link_id: url_md5_hash} 字典
+
+        Returns:
+            (新增的 source_link_id 列表, 变更的 source_link_id 列表)
+        """
+        if not url_hashes:
+            return [], []
+
+        self.connect()
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text("""
+                    SELECT s.id, t.source_link_id IS NULL AS is_new
+                    FROM unnest(CAST(:ids AS integer[]), CAST(:hashes AS text[])) AS s(id, url_hash)
+                    LEFT JOIN crawl_tasks t ON t.source_link_id = s.id
+                    WHERE t.source_link_id IS NULL
+                       OR t.url_hash IS DISTINCT FROM s.url_hash
+                """),
+                {"ids": list(url_hashes.keys()), "hashes": list(url_hashes.values())}
+            )
+            new_ids, changed_ids = [], []
+            for source_id, is_new in result:
+                (new_ids if is_new else changed_ids).append(source_id)
+            return new_ids, changed_ids
+
     # ==================== 节点管理 ====================
 
     @with_retry(max_retries=3, delay=1)
@@ -615,6 +708,107 @@ class TargetDatabase:
             )
             conn.commit()
 
+    @with_retry(max_retries=3, delay=1)
+    def batch_update_files_renamed(self, updates: List[Dict[str, Any]], llm_processed: bool = True):
+        """
+        批量更新文件重命名结果（一条 UPDATE ... FROM unnest，一次往返）
+
+        Args:
+            updates: 更新列表，每项包含:
+                     file_id, renamed_name, llm_model, llm_confidence, llm_raw_response
+            llm_processed: 是否经过 LLM 处理；未调用 LLM（如原名已符合规范）时传 False
+        """
+        if not updates:
+            return
+
+        self.connect()
+        with self.engine.connect() as conn:
+            conn.execute(
+                text("""
+                    UPDATE crawl_files f SET
+                        renamed_name = v.renamed_name,
+                        llm_processed = :llm_processed,
+                        llm_model = v.llm_model,
+                        llm_confidence = v.llm_confidence,
+                        llm_raw_response = v.llm_raw_response,
+                        process_status = 'completed'
+                    FROM unnest(
+                        CAST(:ids AS integer[]), CAST(:names AS text[]),
+                        CAST(:models AS text[]), CAST(:confidences AS double precision[]),
+                        CAST(:raw_responses AS text[])
+                    ) AS v(id, renamed_name, llm_model, llm_confidence, llm_raw_response)
+                    WHERE f.id = v.id
+                """),
+                {
+                    "ids": [u['file_id'] for u in updates],
+                    "names": [u['renamed_name'] for u in updates],
+                    "models": [u['llm_model'] for u in updates],
+                    "confidences": [u['llm_confidence'] for u in updates],
+                    "raw_responses": [u['llm_raw_response'] for u in updates],
+                    "llm_processed": llm_processed,
+                }
+            )
+            conn.commit()
+
+    def count_files_by_status(self, download_status: str = None, process_status: str = None) -> int:
+        """
+        统计指定下载/处理状态的文件数（数据库端 COUNT，不拉取行数据）
+
+        Args:
+            download_status: 下载状态，None 表示不限
+            process_status: 处理状态，None 表示不限
+        """
+        self.connect()
+        sql = "SELECT COUNT(*) FROM crawl_files WHERE TRUE"
+        params = {}
+        if download_status:
+            sql += " AND download_status = :download_status"
+            params["download_status"] = download_status
+        if process_status:
+            sql += " AND process_status = :process_status"
+            params["process_status"] = process_status
+
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql), params).scalar()
+
+    def get_files_by_status(self, download_status: str, process_status: str = 'pending',
+                            limit: int = None) -> List[FileRecord]:
+        """
+        按下载/处理状态获取文件列表
+
+        Args:
+            download_status: 下载状态
+            process_status: 处理状态，默认只取尚未处理的文件
+            limit: 最多返回条数
+        """
+        self.connect()
+        sql = "SELECT * FROM crawl_files WHERE download_status = :download_status AND process_status = :process_status ORDER BY id"
+        params = {"download_status": download_status, "process_status": process_status}
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+
+        with self.engine.connect() as conn:
+            result = conn.execute(text(sql), params)
+            return [
+                FileRecord(
+                    id=row.id,
+                    task_id=row.task_id,
+                    node_id=row.node_id,
+                    original_url=row.original_url,
+                    original_name=row.original_name,
+                    renamed_name=row.renamed_name,
+                    file_extension=row.file_extension,
+                    file_size=row.file_size,
+                    storage_path=row.storage_path,
+                    storage_bucket=row.storage_bucket,
+                    llm_processed=row.llm_processed,
+                    download_status=row.download_status,
+                    process_status=row.process_status
+                )
+                for row in result
+            ]
+
     def get_pending_files(self, task_id: int = None) -> List[Dict[str, Any]]:
         """获取待下载的文件"""
         self.connect()
@@ -768,6 +962,24 @@ class TargetDatabase:
             )
             conn.commit()
 
+    def delete_tasks_by_source_ids(self, source_link_ids: List[int]) -> int:
+        """
+        批量删除指定源链接的任务及其所有数据 (一次 DELETE)
+
+        Returns:
+            删除的任务数
+        """
+        if not source_link_ids:
+            return 0
+        self.connect()
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text("DELETE FROM crawl_tasks WHERE source_link_id = ANY(:ids)"),
+                {"ids": list(source_link_ids)}
+            )
+            conn.commit()
+            return result.rowcount
+
 
 # 测试代码
 if __name__ == "__main__":
@@ -36,6 +36,10 @@ import Sdata
 class OverViewV3:
     """OverView V0.3 主控制器"""
 
+    # 每次批量准备的任务数：旧数据清理、学校名称查询、任务创建按批各一次往返
+    # 批次不宜过大，中断时已准备但未开始的任务需标记为失败等待重试
+    PREPARE_BATCH_SIZE = 20
+
     def __init__(self):
         """初始化"""
         # 数据库连接
@@ -612,31 +616,44 @@ class OverViewV3:
             print(f"\n[Phase 2] 开始爬取 ({len(pending_links)} 个任务)")
             print("-" * 40)
 
-            for i, link in enumerate(pending_links):
-                print(f"\n{'=' * 50}")
-                print(f"任务 {i + 1}/{len(pending_links)}")
-                print(f"{'=' * 50}")
-
-                # 准备任务
-                task_id = self.sync.prepare_task_for_link(link)
-
-                # 爬取
-                self.crawl_single_link(link, task_id)
-
-                # Phase 3: 下载文件
-                if self.enable_download:
-                    self.download_files(task_id)
-
-                # Phase 4: LLM 处理
-                if self.enable_rename:
-                    self.process_files(task_id)
-                    # Phase 4.5: 补充 Unknown 字段
-                    self.fill_unknown_names(task_id)
-
-                # Phase 5: 清理临时文件
-                self.cleanup_task_temp_files(task_id)
-
-                OKNoise()
+            # 已准备但尚未开始爬取的任务 {source_link_id: task_id}
+            prepared = {}
+            try:
+                for i, link in enumerate(pending_links):
+                    print(f"\n{'=' * 50}")
+                    print(f"任务 {i + 1}/{len(pending_links)}")
+                    print(f"{'=' * 50}")
+
+                    # 准备任务：按批清理旧数据并创建任务
+                    if link.id not in prepared:
+                        prepared = self.sync.prepare_tasks_for_links(
+                            pending_links[i:i + self.PREPARE_BATCH_SIZE]
+                        )
+                    task_id = prepared.pop(link.id)
+
+                    # 爬取
+                    self.crawl_single_link(link, task_id)
+
+                    # Phase 3: 下载文件
+                    if self.enable_download:
+                        self.download_files(task_id)
+
+                    # Phase 4: LLM 处理
+                    if self.enable_rename:
+                        self.process_files(task_id)
+                        # Phase 4.5: 补充 Unknown 字段
+                        self.fill_unknown_names(task_id)
+
+                    # Phase 5: 清理临时文件
+                    self.cleanup_task_temp_files(task_id)
+
+                    OKNoise()
+            finally:
+                # 中断时本批剩余任务已创建但未爬取，标记为失败，下次运行作为失败任务重试
+                for task_id in prepared.values():
+                    self.target_db.update_task_status(
+                        task_id, 'failed', error_message='运行中断，任务未开始'
+                    )
 
             # 完成
             elapsed = (time.time() - start_time) / 60
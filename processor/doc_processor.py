@@ -48,8 +48,8 @@ class DocProcessor:
         else:
             return self._extract_from_docx(doc_path, max_paragraphs)
 
-    def _extract_from_docx(self, docx_path: str, max_paragraphs: int) -> DocContent:
-        """提取 DOCX 文件"""
+    def _extract_from_docx(self, docx_path, max_paragraphs: int) -> DocContent:
+        """提取 DOCX 文件（docx_path 可以是路径或文件对象）"""
         try:
             from docx import Document
 
@@ -153,50 +153,19 @@ class DocProcessor:
         max_paragraphs = max_paragraphs or self.max_paragraphs
 
         if file_extension.lower() == '.doc':
-            return DocContent(
-                success=False,
-                text="",
-                paragraph_count=0,
-                error_message="旧版 .doc 格式不支持从字节直接提取"
-            )
-
-        try:
-            from docx import Document
-
-            doc = Document(io.BytesIO(doc_bytes))
-            text_parts = []
-            count = 0
-
-            for para in doc.paragraphs:
-                if count >= max_paragraphs:
-                    break
-                text = para.text.strip()
-                if text:
-                    text_parts.append(text)
-                    count += 1
-
-            full_text = "\n\n".join(text_parts)
-
-            return DocContent(
-                success=True,
-                text=full_text,
-                paragraph_count=len(text_parts)
-            )
-
-        except ImportError:
-            return DocContent(
-                success=False,
-                text="",
-                paragraph_count=0,
-                error_message="需要安装 python-docx: pip install python-docx"
-            )
-        except Exception as e:
-            return DocContent(
-                success=False,
-                text="",
-                paragraph_count=0,
-                error_message=f"提取失败: {str(e)}"
-            )
+            # antiword 只能读文件，先写入临时文件
+            import os
+            import tempfile
+            with tempfile.NamedTemporaryFile(suffix='.doc', delete=False) as tmp_file:
+                tmp_file.write(doc_bytes)
+                tmp_path = tmp_file.name
+            try:
+                return self._extract_from_doc(tmp_path, max_paragraphs)
+            finally:
+                os.unlink(tmp_path)
+
+        # python-docx 可直接读取文件对象，与按路径提取共用同一逻辑（含表格）
+        return self._extract_from_docx(io.BytesIO(doc_bytes), max_paragraphs)
 
     def is_docx_valid(self, docx_path: str) -> bool:
         """检查 DOCX 是否有效"""
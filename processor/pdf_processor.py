@@ -5,10 +5,31 @@ PDF 文件处理器
 """
 
 import io
+import os
 from typing import Optional, List, Literal
 from dataclasses import dataclass
 
 
+def preload_docling() -> bool:
+    """
+    在主进程中预先导入 Docling 模块（须在 fork Worker 之前调用）
+
+    只导入模块，不创建转换器、不调用任何 CUDA 接口；fork 出的 Worker 直接继承
+    已加载的 docling/torch，无需各自重新导入。每个 Worker 的 CUDA_VISIBLE_DEVICES
+    仍在其首次使用 GPU 时生效
+
+    Returns:
+        是否导入成功（未安装 docling 时返回 False）
+    """
+    try:
+        import docling.document_converter  # noqa: F401
+        import docling.datamodel.pipeline_options  # noqa: F401
+        import docling.datamodel.base_models  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
 @dataclass
 class PDFContent:
     """PDF内容提取结果"""
@@ -100,8 +121,32 @@ class PDFProcessor:
             print(f"[PDF] Docling 初始化失败: {e}")
             return None
 
-    def _extract_with_docling(self, pdf_path: str, num_pages: int) -> PDFContent:
-        """使用 Docling 提取 PDF 文字（支持OCR）"""
+    def _docling_document_to_content(self, doc, num_pages: int) -> PDFContent:
+        """将 Docling 文档对象转换为 PDFContent"""
+        # 导出为 Markdown（保留结构）
+        full_text = doc.export_to_markdown()
+
+        # 获取页数信息
+        total_pages = len(doc.pages) if hasattr(doc, 'pages') else 0
+
+        # 如果需要限制页数，截取内容
+        if num_pages and total_pages > num_pages:
+            # Docling 按页导出比较复杂，这里简单截取前 N 页的估算字符数
+            # 一般日本大学文档每页约 1500-2000 字符
+            estimated_chars = num_pages * 2000
+            if len(full_text) > estimated_chars:
+                full_text = full_text[:estimated_chars] + "\n\n[... 内容已截断 ...]"
+
+        return PDFContent(
+            success=True,
+            text=full_text,
+            page_count=total_pages,
+            extracted_pages=min(num_pages, total_pages) if num_pages else total_pages,
+            extractor_used="docling"
+        )
+
+    def _extract_with_docling(self, pdf_path, num_pages: int) -> PDFContent:
+        """使用 Docling 提取 PDF 文字（支持OCR），pdf_path 可以是文件路径或 DocumentStream"""
         try:
             converter = self._init_docling_converter()
             if converter is None:
@@ -116,29 +161,7 @@ class PDFProcessor:
 
             # 转换 PDF
             result = converter.convert(pdf_path)
-            doc = result.document
-
-            # 导出为 Markdown（保留结构）
-            full_text = doc.export_to_markdown()
-
-            # 获取页数信息
-            total_pages = len(doc.pages) if hasattr(doc, 'pages') else 0
-
-            # 如果需要限制页数，截取内容
-            if num_pages and total_pages > num_pages:
-                # Docling 按页导出比较复杂，这里简单截取前 N 页的估算字符数
-                # 一般日本大学文档每页约 1500-2000 字符
-                estimated_chars = num_pages * 2000
-                if len(full_text) > estimated_chars:
-                    full_text = full_text[:estimated_chars] + "\n\n[... 内容已截断 ...]"
-
-            return PDFContent(
-                success=True,
-                text=full_text,
-                page_count=total_pages,
-                extracted_pages=min(num_pages, total_pages) if num_pages else total_pages,
-                extractor_used="docling"
-            )
+            return self._docling_document_to_content(result.document, num_pages)
 
         except Exception as e:
             return PDFContent(
@@ -176,6 +199,55 @@ class PDFProcessor:
         # 使用 pdfplumber（纯文本PDF）
         return self._extract_with_pdfplumber(pdf_path, num_pages)
 
+    def extract_texts(self, pdf_paths: List[str], num_pages: int = None) -> List[PDFContent]:
+        """
+        批量提取多个 PDF 前 N 页的文字
+
+        Docling 模式下通过一次 convert_all 调用处理整批文件，
+        单个文件失败时回退到 pdfplumber
+
+        Args:
+            pdf_paths: PDF 文件路径列表
+            num_pages: 提取页数，默认使用 self.max_pages
+
+        Returns:
+            PDFContent 列表，顺序与 pdf_paths 一致
+        """
+        num_pages = num_pages or self.max_pages
+        results: List[Optional[PDFContent]] = [None] * len(pdf_paths)
+
+        if self.use_docling and pdf_paths:
+            converter = self._init_docling_converter()
+            if converter is not None:
+                try:
+                    from docling.datamodel.base_models import ConversionStatus
+
+                    # 按解析后的路径对应结果，Docling 跳过或打乱某个输入时不会错位到其他文件
+                    indices_by_path = {}
+                    for i, pdf_path in enumerate(pdf_paths):
+                        indices_by_path.setdefault(os.path.realpath(pdf_path), []).append(i)
+
+                    conv_results = converter.convert_all(pdf_paths, raises_on_error=False)
+                    for conv_result in conv_results:
+                        if conv_result.status not in (ConversionStatus.SUCCESS, ConversionStatus.PARTIAL_SUCCESS):
+                            continue
+                        indices = indices_by_path.get(os.path.realpath(conv_result.input.file))
+                        if not indices:
+                            continue
+                        content = self._docling_document_to_content(conv_result.document, num_pages)
+                        for i in indices:
+                            results[i] = content
+                except Exception as e:
+                    print(f"[PDF] Docling 批量提取失败: {e}")
+
+        for i, pdf_path in enumerate(pdf_paths):
+            if results[i] is None:
+                if self.use_docling:
+                    print(f"[PDF] Docling 失败，回退到 pdfplumber: {pdf_path}")
+                results[i] = self._extract_with_pdfplumber(pdf_path, num_pages)
+
+        return results
+
     def _extract_with_pdfplumber(self, pdf_path: str, num_pages: int) -> PDFContent:
         """使用 pdfplumber 提取 PDF 文字（仅支持纯文本PDF）"""
         try:
@@ -269,7 +341,7 @@ class PDFProcessor:
         """
         从字节数据提取 PDF 文字
 
-        注意：Docling 不支持直接从字节提取，需要先保存为临时文件
+        Docling 通过 DocumentStream 直接读取内存中的数据，不写临时文件
 
         Args:
             pdf_bytes: PDF 字节数据
@@ -280,25 +352,18 @@ class PDFProcessor:
         """
         num_pages = num_pages or self.max_pages
 
-        # 如果使用 Docling，需要先保存为临时文件
         if self.use_docling:
-            import tempfile
-            import os
             try:
-                with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-                    tmp_file.write(pdf_bytes)
-                    tmp_path = tmp_file.name
-
-                result = self._extract_with_docling(tmp_path, num_pages)
+                from docling.datamodel.base_models import DocumentStream
 
-                # 清理临时文件
-                os.unlink(tmp_path)
+                source = DocumentStream(name="document.pdf", stream=io.BytesIO(pdf_bytes))
+                result = self._extract_with_docling(source, num_pages)
 
                 if result.success:
                     return result
                 print(f"[PDF] Docling 失败，回退到 pdfplumber: {result.error_message}")
-            except Exception as e:
-                print(f"[PDF] Docling 临时文件处理失败: {e}")
+            except ImportError:
+                print("[PDF] Docling 未安装，回退到 pdfplumber")
 
         # 回退到 pdfplumber
         try:
@@ -9,34 +9,58 @@
 - 自动资源检测模式 (--auto)
 
 架构:
-Chrome Workers → PDF Queue → Docling GPU Workers → LLM Thread Pool → 结果
+Chrome Workers → PDF Queue → Docling GPU Workers (进程内 LLM 线程池) → 结果
 """
 
 import os
 import sys
 import time
 import signal
+import threading
 import logging
 import argparse
 import subprocess
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from datetime import datetime
-from multiprocessing import Process, Queue, Manager, cpu_count
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Empty
+import multiprocessing
+from multiprocessing import cpu_count
+from multiprocessing.queues import JoinableQueue
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, SimpleQueue
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Docling 本身（docling/torch）由 preload_docling 在 fork Worker 前导入
+from processor.pdf_processor import PDFProcessor, preload_docling
+from processor.doc_processor import DocProcessor
+
+# 非 Windows 平台使用 fork：子进程通过写时复制继承父进程已导入的模块，无需重新导入
+MP_CONTEXT = multiprocessing.get_context('fork' if sys.platform != 'win32' else 'spawn')
+
+# file_queue 中的任务用 msgpack 序列化（比 pickle 快），未安装时退回 pickle
+try:
+    import msgpack
+    _pack_task = msgpack.Packer(use_bin_type=True).pack
+
+    def _unpack_task(data):
+        return msgpack.unpackb(data, raw=False)
+except ImportError:
+    def _pack_task(task):
+        return task
+
+    def _unpack_task(data):
+        return data
+
 
 # ============================================================
 # 配置（必须在最前面定义）
 # ============================================================
 
-@dataclass
+@dataclass(frozen=True)
 class PipelineConfig:
-    """Pipeline 配置"""
+    """Pipeline 配置（不可变，直接传给子进程）"""
     # Chrome 爬虫配置
     chrome_workers: int = 4
     crawl_depth: int = 1
@@ -45,8 +69,9 @@ class PipelineConfig:
     docling_workers: int = 3
     use_gpu: bool = True
     max_pages: int = 2
+    docling_batch: int = 4      # 每次从队列批量取出的文件数
 
-    # LLM 配置
+    # LLM 配置（总线程数，平均分配到各 Docling Worker）
     llm_workers: int = 25
 
     # 任务配置
@@ -58,6 +83,11 @@ class PipelineConfig:
     # 其他
     log_level: str = "INFO"
 
+    @property
+    def refill_threshold(self) -> int:
+        """待爬取链接低于该值时触发补充"""
+        return self.chrome_workers * 2
+
 
 # ============================================================
 # 资源监控和自动配置
@@ -382,24 +412,61 @@ class ExtractResult:
     text: Optional[str] = None
     error_message: Optional[str] = None
     context: Optional[Dict] = None
+    local_path: str = ''
+    extract_time: float = 0.0
 
 
 # ============================================================
 # Chrome 爬虫 Worker
 # ============================================================
 
+def _take_link(worker_id: int, task_queues: List[JoinableQueue], timeout: float = 5):
+    """
+    优先从自己的队列获取任务，为空时从其他 Worker 的队列窃取
+
+    停止信号 (None) 只由队列所属的 Worker 消费，窃取到时放回原队列
+
+    Returns:
+        (来源队列, 任务)，处理完后需对来源队列调用 task_done()
+    """
+    own = task_queues[worker_id]
+    try:
+        return own, own.get(timeout=timeout)
+    except Empty:
+        pass
+
+    for offset in range(1, len(task_queues)):
+        sibling = task_queues[(worker_id + offset) % len(task_queues)]
+        try:
+            link_data = sibling.get_nowait()
+        except Empty:
+            continue
+        if link_data is None:
+            sibling.put(None)
+            sibling.task_done()
+            continue
+        return sibling, link_data
+
+    raise Empty
+
+
 def chrome_worker(
     worker_id: int,
-    task_queue: Queue,
-    file_queue: Queue,
-    result_dict: Dict,
-    config: Dict,
+    task_queues: List[JoinableQueue],
+    file_queue: JoinableQueue,
+    completed_count,
+    queued_count,
+    refill_event,
+    chrome_launch_lock,
+    chrome_gate,
+    config: PipelineConfig,
     stop_event
 ):
     """
     Chrome 爬虫 Worker
 
-    从 task_queue 获取链接，爬取后将文件放入 file_queue
+    从自己的 task_queue 获取链接（空闲时窃取其他 Worker 的任务），爬取后将文件放入 file_queue
+    每个任务需先取得 chrome_gate 许可，解析积压时主进程会收回部分许可
     """
     logger = logging.getLogger(f"Chrome-{worker_id}")
     logger.info(f"Chrome Worker {worker_id} 启动")
@@ -415,8 +482,10 @@ def chrome_worker(
     target_db = None
 
     try:
-        # 初始化 Chrome
-        chrome = overViewInit()
+        # 初始化 Chrome（逐个启动，错开资源争抢）
+        with chrome_launch_lock:
+            chrome = overViewInit()
+            time.sleep(1.5)
 
         # 初始化数据库连接
         target_db = TargetDatabase()
@@ -428,14 +497,25 @@ def chrome_worker(
         storage.connect()
 
         while not stop_event.is_set():
+            # 下游积压时暂停，直到主进程归还许可
+            if not chrome_gate.acquire(timeout=5):
+                continue
+
+            source_queue = None
             try:
-                # 从队列获取任务（超时 5 秒）
-                link_data = task_queue.get(timeout=5)
+                # 从队列获取任务（自己的队列最多等待 5 秒）
+                source_queue, link_data = _take_link(worker_id, task_queues)
 
                 if link_data is None:  # 停止信号
                     logger.info(f"Chrome Worker {worker_id} 收到停止信号")
                     break
 
+                # 队列余量不足时通知主进程补充任务
+                with queued_count.get_lock():
+                    queued_count.value -= 1
+                    if queued_count.value < config.refill_threshold:
+                        refill_event.set()
+
                 link_id, link_url, link_type = link_data
                 logger.info(f"[Worker-{worker_id}] 开始处理 link_id={link_id}")
 
@@ -454,7 +534,7 @@ def chrome_worker(
 
                 # 爬取
                 sign = f"task_{task_id}"
-                ov = OverView(link_url, depth=config['crawl_depth'], sign=sign)
+                ov = OverView(link_url, depth=config.crawl_depth, sign=sign)
                 ov.SetOriUrl(link_url)
                 ov.start(chrome)
                 ov.Seek()
@@ -519,7 +599,10 @@ def chrome_worker(
                         if result.success:
                             # 上传到 Storage
                             remote_path = f"task_{task_id}/raw/{result.file_name}"
-                            storage_path = storage.upload_file(result.local_path, remote_path)
+                            storage_path = storage.upload_file(
+                                result.local_path, remote_path,
+                                skip_unchanged=existing_task is not None
+                            )
 
                             target_db.update_file_download(
                                 file_id, 'completed',
@@ -543,7 +626,7 @@ def chrome_worker(
                                     'school_name': ''
                                 }
                             }
-                            file_queue.put(file_task)
+                            file_queue.put(_pack_task(file_task))
                             downloaded_count += 1
                             logger.info(f"[Worker-{worker_id}] 下载成功: {result.file_name}")
                         else:
@@ -556,12 +639,8 @@ def chrome_worker(
                 target_db.update_task_status(task_id, 'processing', node_count=node_count, file_count=downloaded_count)
 
                 # 记录结果
-                result_dict[link_id] = {
-                    'success': True,
-                    'task_id': task_id,
-                    'node_count': node_count,
-                    'file_count': downloaded_count
-                }
+                with completed_count.get_lock():
+                    completed_count.value += 1
 
                 logger.info(f"[Worker-{worker_id}] 完成 task_id={task_id}, 文件数={downloaded_count}")
 
@@ -572,6 +651,10 @@ def chrome_worker(
                 import traceback
                 traceback.print_exc()
                 continue
+            finally:
+                if source_queue is not None:
+                    source_queue.task_done()
+                chrome_gate.release()
 
     except Exception as e:
         logger.error(f"Chrome Worker {worker_id} 初始化失败: {e}")
@@ -591,233 +674,274 @@ def chrome_worker(
 
 
 # ============================================================
-# Docling GPU Worker
+# LLM 重命名（在 Docling Worker 进程内的线程池中执行）
 # ============================================================
 
-def docling_worker(
-    worker_id: int,
-    file_queue: Queue,
-    text_queue: Queue,
-    config: Dict,
-    stop_event
-):
-    """
-    Docling GPU Worker
-
-    从 file_queue 获取文件，解析后将文本放入 text_queue
-    """
-    logger = logging.getLogger(f"Docling-{worker_id}")
-    logger.info(f"Docling Worker {worker_id} 启动")
-
-    # 设置 GPU
-    if config['use_gpu']:
-        os.environ['CUDA_VISIBLE_DEVICES'] = '0'  # 所有 worker 共享 GPU
-
-    # 初始化 Docling
-    from processor.pdf_processor import PDFProcessor
-    from processor.doc_processor import DocProcessor
+_llm_local = threading.local()
 
-    pdf_processor = PDFProcessor(
-        max_pages=config['max_pages'],
-        use_docling=True,
-        force_ocr=False
-    )
-    doc_processor = DocProcessor(max_paragraphs=50)
+# 待删除的本地文件，由后台线程统一删除，不占用 LLM 线程
+_unlink_queue = SimpleQueue()
 
-    processed_count = 0
 
-    while not stop_event.is_set():
+def _unlink_loop():
+    """后台删除线程：依次删除队列中的本地文件，收到 None 时退出"""
+    while True:
+        path = _unlink_queue.get()
+        if path is None:
+            break
         try:
-            # 从队列获取文件（超时 10 秒）
-            file_task = file_queue.get(timeout=10)
+            os.remove(path)
+        except OSError:
+            pass
 
-            if file_task is None:  # 停止信号
-                logger.info(f"Docling Worker {worker_id} 收到停止信号")
-                break
 
-            file_id = file_task['file_id']
-            local_path = file_task['local_path']
+def _get_llm_handles():
+    """获取当前线程的 LLMRenamer 和 TargetDatabase（每个线程初始化一次）"""
+    if not hasattr(_llm_local, 'renamer'):
+        import Sdata
+        from db.target_db import TargetDatabase
+        from processor.llm_renamer import LLMRenamer
 
-            logger.info(f"[Docling-{worker_id}] 开始解析 file_id={file_id}")
+        renamer = LLMRenamer(api_key=Sdata.Dou_Bao_Key)
+        renamer.connect()
+        renamer.load_prompt_template()
 
-            start_time = time.time()
+        target_db = TargetDatabase()
+        target_db.connect()
 
-            # 根据文件类型选择处理器
-            ext = os.path.splitext(local_path)[1].lower()
+        _llm_local.renamer = renamer
+        _llm_local.target_db = target_db
 
-            if ext == '.pdf':
-                result = pdf_processor.extract_text(local_path)
-            elif ext in ['.doc', '.docx']:
-                result = doc_processor.extract_text(local_path)
-            else:
-                result = type('obj', (object,), {'success': False, 'text': '', 'error_message': f'不支持的文件类型: {ext}'})()
+    return _llm_local.renamer, _llm_local.target_db
 
-            extract_time = time.time() - start_time
 
-            # 放入文本队列
-            text_result = {
+def llm_rename_and_persist(text_result: ExtractResult) -> Dict:
+    """调用 LLM 重命名单个文件，并将结果写入数据库"""
+    file_id = text_result.file_id
+
+    try:
+        if not text_result.success or not text_result.text:
+            return {
                 'file_id': file_id,
-                'task_id': file_task['task_id'],
-                'success': result.success,
-                'text': result.text if result.success else None,
-                'error_message': result.error_message if not result.success else None,
-                'context': file_task['context'],
-                'local_path': local_path,
-                'extract_time': extract_time
+                'success': False,
+                'error': text_result.error_message or '文本提取失败'
             }
-            text_queue.put(text_result)
 
-            processed_count += 1
-            logger.info(f"[Docling-{worker_id}] 解析完成 file_id={file_id}, 耗时={extract_time:.1f}s, 累计={processed_count}")
+        renamer, target_db = _get_llm_handles()
 
-        except Empty:
-            continue
-        except Exception as e:
-            logger.error(f"[Docling-{worker_id}] 错误: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
+        # 调用 LLM
+        rename_result = renamer.rename_from_text(
+            text_result.text,
+            text_result.context,
+            os.path.splitext(text_result.local_path)[1]
+        )
 
-    logger.info(f"Docling Worker {worker_id} 退出, 共处理 {processed_count} 个文件")
+        if rename_result.success and rename_result.renamed_name:
+            # 更新数据库
+            target_db.update_file_renamed(
+                file_id,
+                renamed_name=rename_result.renamed_name,
+                llm_model=renamer.model,
+                llm_confidence=rename_result.confidence,
+                llm_raw_response=rename_result.raw_response
+            )
+
+            return {
+                'file_id': file_id,
+                'success': True,
+                'renamed_name': rename_result.renamed_name
+            }
+        else:
+            return {
+                'file_id': file_id,
+                'success': False,
+                'error': rename_result.error_message
+            }
+
+    except Exception as e:
+        return {
+            'file_id': file_id,
+            'success': False,
+            'error': str(e)
+        }
+    finally:
+        # 清理本地文件（交给后台线程删除）
+        _unlink_queue.put(text_result.local_path)
 
 
 # ============================================================
-# LLM 重命名 Worker
+# Docling GPU Worker
 # ============================================================
 
-def llm_worker(
-    text_queue: Queue,
-    config: Dict,
+class _UnsupportedResult:
+    """不支持的文件类型的解析结果"""
+    __slots__ = ('success', 'text', 'error_message')
+
+    def __init__(self, ext: str):
+        self.success = False
+        self.text = ''
+        self.error_message = f'不支持的文件类型: {ext}'
+
+
+def docling_worker(
+    worker_id: int,
+    file_queue: JoinableQueue,
+    config: PipelineConfig,
     stop_event
 ):
     """
-    LLM 重命名 Worker
+    Docling GPU Worker
 
-    从 text_queue 获取文本，使用线程池并行调用 LLM
+    从 file_queue 获取文件，解析后直接在本进程的线程池中调用 LLM 重命名
     """
-    logger = logging.getLogger("LLM-Pool")
-    logger.info(f"LLM Worker 启动, 线程数={config['llm_workers']}")
+    logger = logging.getLogger(f"Docling-{worker_id}")
+    llm_threads = max(1, config.llm_workers // config.docling_workers)
+    logger.info(f"Docling Worker {worker_id} 启动, LLM 线程数={llm_threads}")
 
-    import Sdata
-    from db.target_db import TargetDatabase
-    from processor.llm_renamer import LLMRenamer
+    # 初始化 Docling
+    pdf_processor = PDFProcessor(
+        max_pages=config.max_pages,
+        use_docling=True,
+        force_ocr=False
+    )
+    doc_processor = DocProcessor(max_paragraphs=50)
 
-    # 初始化
-    target_db = TargetDatabase()
-    target_db.connect()
+    # 非 PDF 文件按扩展名分派解析函数（PDF 整批交给 Docling）
+    extractors = {
+        '.doc': doc_processor.extract_text,
+        '.docx': doc_processor.extract_text,
+    }
 
-    renamer = LLMRenamer(api_key=Sdata.Dou_Bao_Key)
-    renamer.connect()
-    renamer.load_prompt_template()
+    llm_executor = ThreadPoolExecutor(max_workers=llm_threads, thread_name_prefix=f"LLM-{worker_id}")
+    unlink_thread = threading.Thread(target=_unlink_loop, name=f"Unlink-{worker_id}", daemon=True)
+    unlink_thread.start()
 
-    pending_tasks = []  # 待处理的任务
     processed_count = 0
+    batch_size = max(1, config.docling_batch)
 
-    def process_single(text_result):
-        """处理单个文件的 LLM 调用"""
-        file_id = text_result['file_id']
+    # LLM 在途任务上限：线程全部忙碌时不再从 file_queue 取任务，
+    # 积压留在 file_queue 中，主进程的 qsize 节流才能感知到
+    llm_slots = threading.BoundedSemaphore(llm_threads)
+    slot_held = False  # 取任务前预先占用的一个名额，供本批第一个提交使用
 
+    def log_rename_result(future):
+        """LLM 任务完成回调：记录结果，释放名额，并标记 file_queue 中的任务已完成"""
         try:
-            if not text_result['success'] or not text_result['text']:
-                return {
-                    'file_id': file_id,
-                    'success': False,
-                    'error': text_result.get('error_message', '文本提取失败')
-                }
-
-            # 调用 LLM
-            rename_result = renamer.rename_from_text(
-                text_result['text'],
-                text_result['context'],
-                os.path.splitext(text_result['local_path'])[1]
-            )
-
-            if rename_result.success and rename_result.renamed_name:
-                # 更新数据库
-                target_db.update_file_renamed(
-                    file_id,
-                    renamed_name=rename_result.renamed_name,
-                    llm_model=renamer.model,
-                    llm_confidence=rename_result.confidence,
-                    llm_raw_response=rename_result.raw_response
-                )
-
-                return {
-                    'file_id': file_id,
-                    'success': True,
-                    'renamed_name': rename_result.renamed_name
-                }
+            result = future.result()
+            if result['success']:
+                logger.info(f"[LLM] 重命名成功 file_id={result['file_id']}: {result.get('renamed_name', '')}")
             else:
-                return {
-                    'file_id': file_id,
-                    'success': False,
-                    'error': rename_result.error_message
-                }
-
+                logger.warning(f"[LLM] 重命名失败 file_id={result['file_id']}: {result.get('error', '')}")
         except Exception as e:
-            return {
-                'file_id': file_id,
-                'success': False,
-                'error': str(e)
-            }
+            logger.error(f"[LLM] 处理错误: {e}")
         finally:
-            # 清理本地文件
-            try:
-                if os.path.exists(text_result['local_path']):
-                    os.remove(text_result['local_path'])
-            except:
-                pass
-
-    # 使用线程池
-    with ThreadPoolExecutor(max_workers=config['llm_workers']) as executor:
-        futures = {}
-
-        while not stop_event.is_set():
-            try:
-                # 尝试获取新任务
-                try:
-                    text_result = text_queue.get(timeout=2)
+            llm_slots.release()
+            file_queue.task_done()
+
+    def emit(file_task, result, extract_time):
+        """将解析结果提交给 LLM 线程池（无空闲名额时阻塞等待）"""
+        nonlocal slot_held
+        if slot_held:
+            slot_held = False
+        else:
+            llm_slots.acquire()
+        text_result = ExtractResult(
+            file_id=file_task['file_id'],
+            task_id=file_task['task_id'],
+            success=result.success,
+            text=result.text if result.success else None,
+            error_message=result.error_message if not result.success else None,
+            context=file_task['context'],
+            local_path=file_task['local_path'],
+            extract_time=extract_time
+        )
+        llm_executor.submit(llm_rename_and_persist, text_result).add_done_callback(log_rename_result)
+        logger.info(f"[Docling-{worker_id}] 解析完成 file_id={file_task['file_id']}, 耗时={extract_time:.1f}s")
 
-                    if text_result is None:  # 停止信号
-                        logger.info("LLM Worker 收到停止信号")
-                        break
+    while not stop_event.is_set():
+        unfinished = 0  # 已取出但尚未交给 LLM 线程池的任务数（含停止信号）
 
-                    # 提交到线程池
-                    future = executor.submit(process_single, text_result)
-                    futures[future] = text_result['file_id']
+        # 先等到至少一个 LLM 名额空闲，再从队列取下一批
+        if not llm_slots.acquire(timeout=2):
+            continue
+        slot_held = True
 
+        try:
+            # 从队列获取文件（超时 10 秒），再非阻塞地批量取出剩余任务
+            file_tasks = [file_queue.get(timeout=10)]
+            while len(file_tasks) < batch_size and file_tasks[-1] is not None:
+                try:
+                    file_tasks.append(file_queue.get_nowait())
                 except Empty:
-                    pass
-
-                # 检查已完成的任务
-                done_futures = [f for f in futures if f.done()]
-                for future in done_futures:
-                    file_id = futures.pop(future)
-                    try:
-                        result = future.result()
-                        processed_count += 1
-                        if result['success']:
-                            logger.info(f"[LLM] 重命名成功 file_id={file_id}: {result.get('renamed_name', '')}")
-                        else:
-                            logger.warning(f"[LLM] 重命名失败 file_id={file_id}: {result.get('error', '')}")
-                    except Exception as e:
-                        logger.error(f"[LLM] 处理错误 file_id={file_id}: {e}")
-
-            except Exception as e:
-                logger.error(f"[LLM] 主循环错误: {e}")
-                continue
+                    break
+            unfinished = len(file_tasks)
+
+            stop_received = file_tasks[-1] is None  # 停止信号
+            if stop_received:
+                file_tasks.pop()
+            file_tasks = [_unpack_task(t) for t in file_tasks]
+
+            # 按文件类型分组
+            pdf_tasks = []
+            other_tasks = []
+            for file_task in file_tasks:
+                ext = os.path.splitext(file_task['local_path'])[1].lower()
+                (pdf_tasks if ext == '.pdf' else other_tasks).append(file_task)
+
+            if file_tasks:
+                logger.info(f"[Docling-{worker_id}] 开始解析 {len(file_tasks)} 个文件: "
+                            f"{[t['file_id'] for t in file_tasks]}")
+
+            # PDF 整批交给 Docling
+            if pdf_tasks:
+                start_time = time.time()
+                results = pdf_processor.extract_texts([t['local_path'] for t in pdf_tasks])
+                extract_time = (time.time() - start_time) / len(pdf_tasks)
+                for file_task, result in zip(pdf_tasks, results):
+                    emit(file_task, result, extract_time)
+                    unfinished -= 1
+
+            for file_task in other_tasks:
+                start_time = time.time()
+                ext = os.path.splitext(file_task['local_path'])[1].lower()
+                extract = extractors.get(ext)
+                result = extract(file_task['local_path']) if extract else _UnsupportedResult(ext)
+                emit(file_task, result, time.time() - start_time)
+                unfinished -= 1
+
+            processed_count += len(file_tasks)
+            if file_tasks:
+                logger.info(f"[Docling-{worker_id}] 本批完成 {len(file_tasks)} 个, 累计={processed_count}")
+
+            if stop_received:
+                logger.info(f"Docling Worker {worker_id} 收到停止信号")
+                break
 
-        # 等待剩余任务完成
-        logger.info(f"等待剩余 {len(futures)} 个 LLM 任务完成...")
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                processed_count += 1
-            except:
-                pass
+        except Empty:
+            continue
+        except Exception as e:
+            logger.error(f"[Docling-{worker_id}] 错误: {e}")
+            import traceback
+            traceback.print_exc()
+            continue
+        finally:
+            # 已交给 LLM 的任务在回调中 task_done，其余（停止信号、异常）在这里处理
+            for _ in range(unfinished):
+                file_queue.task_done()
+            # 本批没有用到预先占用的名额（空批、异常）时归还
+            if slot_held:
+                slot_held = False
+                llm_slots.release()
+
+    # 等待剩余 LLM 任务完成
+    logger.info(f"[Docling-{worker_id}] 等待剩余 LLM 任务完成...")
+    llm_executor.shutdown(wait=True)
+
+    # 等待剩余本地文件删除完成
+    _unlink_queue.put(None)
+    unlink_thread.join()
 
-    target_db.close()
-    logger.info(f"LLM Worker 退出, 共处理 {processed_count} 个文件")
+    logger.info(f"Docling Worker {worker_id} 退出, 共处理 {processed_count} 个文件")
 
 
 # ============================================================
@@ -832,16 +956,29 @@ class Pipeline:
         self.logger = setup_logging(config.log_level)
 
         # 进程管理
-        self.manager = Manager()
-        self.task_queue = Queue()      # 待爬取的链接
-        self.file_queue = Queue()      # 待解析的文件
-        self.text_queue = Queue()      # 待重命名的文本
-        self.result_dict = self.manager.dict()  # 结果
-        self.stop_event = self.manager.Event()
+        self.task_queues = [MP_CONTEXT.JoinableQueue() for _ in range(config.chrome_workers)]  # 每个 Chrome Worker 一个待爬取队列
+        self.next_task_queue = 0       # 轮询投放的起始位置
+        self.file_queue = MP_CONTEXT.JoinableQueue()  # 待解析的文件
+        self.completed_count = MP_CONTEXT.Value('q', 0)          # 已完成的爬取任务数
+        self.stop_event = MP_CONTEXT.Event()
+        self.queued_count = MP_CONTEXT.Value('q', 0)             # task_queues 中待爬取的链接数
+        self.refill_event = MP_CONTEXT.Event()        # 队列余量不足时由 Chrome Worker 触发
+        self.refill_threshold = config.refill_threshold
+        self.chrome_launch_lock = MP_CONTEXT.Semaphore(1)  # Chrome Worker 依次初始化浏览器
+
+        # 自适应限流：file_queue 积压时收回 Chrome Worker 的许可，消化后归还
+        self.chrome_gate = MP_CONTEXT.Semaphore(config.chrome_workers)
+        self.chrome_paused = 0
+        self.throttle_stop = threading.Event()
+        self.throttle_thread = None
 
         self.chrome_processes = []
         self.docling_processes = []
-        self.llm_process = None
+
+        # 任务补充用的数据库连接（在 start_workers 中建立，整个运行期间复用）
+        self.source_db = None
+        self.target_db = None
+        self.sync = None
 
         # 信号处理
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -853,107 +990,175 @@ class Pipeline:
 
     def start_workers(self):
         """启动所有 Worker"""
-        config_dict = {
-            'crawl_depth': self.config.crawl_depth,
-            'use_gpu': self.config.use_gpu,
-            'max_pages': self.config.max_pages,
-            'llm_workers': self.config.llm_workers
-        }
+        from db.source_db import SourceDatabase
+        from db.target_db import TargetDatabase
+        from sync.incremental_sync import IncrementalSync
+
+        self.source_db = SourceDatabase()
+        self.source_db.connect()
+        self.target_db = TargetDatabase()
+        self.target_db.connect()
+        self.sync = IncrementalSync(self.source_db, self.target_db)
 
         # 启动 Chrome Workers
         self.logger.info(f"启动 {self.config.chrome_workers} 个 Chrome Worker...")
         for i in range(self.config.chrome_workers):
-            p = Process(
+            p = MP_CONTEXT.Process(
                 target=chrome_worker,
-                args=(i, self.task_queue, self.file_queue, self.result_dict, config_dict, self.stop_event),
+                args=(i, self.task_queues, self.file_queue, self.completed_count,
+                      self.queued_count, self.refill_event, self.chrome_launch_lock,
+                      self.chrome_gate, self.config, self.stop_event),
                 name=f"Chrome-{i}"
             )
             p.start()
             self.chrome_processes.append(p)
-            time.sleep(2)  # 错开启动，避免资源争抢
 
         # 启动 Docling GPU Workers
         self.logger.info(f"启动 {self.config.docling_workers} 个 Docling GPU Worker...")
-        for i in range(self.config.docling_workers):
-            p = Process(
-                target=docling_worker,
-                args=(i, self.file_queue, self.text_queue, config_dict, self.stop_event),
-                name=f"Docling-{i}"
-            )
-            p.start()
-            self.docling_processes.append(p)
-            time.sleep(1)
-
-        # 启动 LLM Worker
-        self.logger.info(f"启动 LLM Worker (线程数={self.config.llm_workers})...")
-        self.llm_process = Process(
-            target=llm_worker,
-            args=(self.text_queue, config_dict, self.stop_event),
-            name="LLM-Pool"
-        )
-        self.llm_process.start()
+        # 主进程先导入 docling（不触碰 CUDA），Worker fork 后直接继承，省去各自的导入耗时
+        if not preload_docling():
+            self.logger.warning("未安装 docling，Docling Worker 将回退到 pdfplumber")
+        gpu_devices = self._get_gpu_devices() if self.config.use_gpu else []
+        original_cuda_env = os.environ.get('CUDA_VISIBLE_DEVICES')
+        try:
+            for i in range(self.config.docling_workers):
+                # 子进程在创建时继承环境变量，需在 start() 之前设置，Worker 轮流分配到各 GPU
+                if gpu_devices:
+                    os.environ['CUDA_VISIBLE_DEVICES'] = gpu_devices[i % len(gpu_devices)]
+                p = MP_CONTEXT.Process(
+                    target=docling_worker,
+                    args=(i, self.file_queue, self.config, self.stop_event),
+                    name=f"Docling-{i}"
+                )
+                p.start()
+                self.docling_processes.append(p)
+                time.sleep(1)
+        finally:
+            if original_cuda_env is None:
+                os.environ.pop('CUDA_VISIBLE_DEVICES', None)
+            else:
+                os.environ['CUDA_VISIBLE_DEVICES'] = original_cuda_env
 
         self.logger.info("所有 Worker 已启动")
 
+        self.throttle_thread = threading.Thread(target=self._throttle_loop, name="Throttle", daemon=True)
+        self.throttle_thread.start()
+
+    def _get_gpu_devices(self) -> List[str]:
+        """可供 Docling Worker 使用的 GPU 编号（优先使用已设置的 CUDA_VISIBLE_DEVICES）"""
+        visible = os.environ.get('CUDA_VISIBLE_DEVICES')
+        if visible:
+            return [d.strip() for d in visible.split(',') if d.strip()]
+        count = ResourceMonitor.get_gpu_info()['count']
+        return [str(i) for i in range(max(count, 1))]
+
+    def _throttle_loop(self, interval: float = 30):
+        """
+        每隔 interval 秒检查 file_queue 积压情况，动态调整工作中的 Chrome Worker 数量
+
+        积压超过 3 倍 Docling Worker 数时暂停一个 Chrome Worker（至少保留一个），
+        低于 Docling Worker 数时恢复一个
+        """
+        high_water = self.config.docling_workers * 3
+        low_water = self.config.docling_workers
+
+        while not self.throttle_stop.wait(interval):
+            try:
+                backlog = self.file_queue.qsize()
+            except NotImplementedError:  # macOS 不支持 qsize()
+                return
+
+            if backlog > high_water and self.chrome_paused < self.config.chrome_workers - 1:
+                # 等待某个 Worker 处理完当前任务后收回其许可
+                if self.chrome_gate.acquire(timeout=5):
+                    self.chrome_paused += 1
+                    self.logger.info(f"[限流] 待解析 {backlog} 个文件，暂停 1 个 Chrome Worker "
+                                     f"(已暂停 {self.chrome_paused})")
+            elif backlog < low_water and self.chrome_paused > 0:
+                self.chrome_gate.release()
+                self.chrome_paused -= 1
+                self.logger.info(f"[限流] 待解析 {backlog} 个文件，恢复 1 个 Chrome Worker "
+                                 f"(已暂停 {self.chrome_paused})")
+
+    def stop_throttle(self):
+        """停止限流线程并归还所有收回的许可"""
+        self.throttle_stop.set()
+        if self.throttle_thread and self.throttle_thread is not threading.current_thread():
+            self.throttle_thread.join()
+        self.throttle_thread = None
+        for _ in range(self.chrome_paused):
+            self.chrome_gate.release()
+        self.chrome_paused = 0
+
     def stop(self):
         """停止所有 Worker"""
         self.logger.info("正在停止所有 Worker...")
         self.stop_event.set()
+        self.stop_throttle()
 
         # 发送停止信号
-        for _ in range(self.config.chrome_workers):
-            self.task_queue.put(None)
+        for task_queue in self.task_queues:
+            task_queue.put(None)
         for _ in range(self.config.docling_workers):
             self.file_queue.put(None)
-        self.text_queue.put(None)
 
         # 等待进程结束
         for p in self.chrome_processes:
             p.join(timeout=30)
         for p in self.docling_processes:
             p.join(timeout=30)
-        if self.llm_process:
-            self.llm_process.join(timeout=30)
-
-        self.logger.info("所有 Worker 已停止")
 
-    def get_pending_links(self, limit: int) -> List:
-        """获取待处理的链接"""
-        from db.source_db import SourceDatabase
-        from db.target_db import TargetDatabase
-        from sync.incremental_sync import IncrementalSync
+        if self.sync:
+            self.sync.close()
+            self.sync = None
 
-        source_db = SourceDatabase()
-        source_db.connect()
-        target_db = TargetDatabase()
-        target_db.connect()
+        self.logger.info("所有 Worker 已停止")
 
-        sync = IncrementalSync(source_db, target_db)
-        pending = sync.get_pending_links(include_failed=True, include_changed=True)
+    def join_queues(self, timeout: float) -> bool:
+        """
+        等待所有队列中的任务处理完毕（包括解析后的 LLM 重命名）
 
-        if self.config.link_type:
-            pending = [l for l in pending if l.table_name == self.config.link_type]
+        JoinableQueue.join() 不支持超时，这里在后台线程中等待
 
-        pending = pending[:limit]
-        result = [(l.id, l.url, l.table_name) for l in pending]
+        Returns:
+            是否在超时前全部完成
+        """
+        def join_all():
+            # 先等爬取完成（爬取会产生新的文件任务），再等解析完成
+            for task_queue in self.task_queues:
+                task_queue.join()
+            self.file_queue.join()
 
-        source_db.close()
-        target_db.close()
+        waiter = threading.Thread(target=join_all, name="QueueJoin", daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
 
-        return result
+    def get_pending_links(self, limit: int) -> List:
+        """获取待处理的链接"""
+        pending = self.sync.get_pending_links(
+            include_failed=True,
+            include_changed=True,
+            link_type=self.config.link_type,
+            limit=limit
+        )
+        return [(l.id, l.url, l.table_name) for l in pending]
 
     def run(self):
         """运行 Pipeline（流水线模式，Chrome 和 Docling 交叉运行）"""
-        self.logger.info("=" * 60)
-        self.logger.info("Pipeline 启动 (流水线模式)")
-        self.logger.info(f"配置:")
-        self.logger.info(f"  Chrome Workers:  {self.config.chrome_workers}")
-        self.logger.info(f"  Docling Workers: {self.config.docling_workers}")
-        self.logger.info(f"  LLM Workers:     {self.config.llm_workers}")
-        self.logger.info(f"  Batch Size:      {self.config.batch_size}")
-        self.logger.info(f"  Crawl Depth:     {self.config.crawl_depth}")
-        self.logger.info(f"  Use GPU:         {self.config.use_gpu}")
-        self.logger.info("=" * 60)
+        separator = "=" * 60
+        self.logger.info(
+            f"{separator}\n"
+            f"Pipeline 启动 (流水线模式)\n"
+            f"配置:\n"
+            f"  Chrome Workers:  {self.config.chrome_workers}\n"
+            f"  Docling Workers: {self.config.docling_workers}\n"
+            f"  LLM Workers:     {self.config.llm_workers}\n"
+            f"  Batch Size:      {self.config.batch_size}\n"
+            f"  Crawl Depth:     {self.config.crawl_depth}\n"
+            f"  Use GPU:         {self.config.use_gpu}\n"
+            f"{separator}"
+        )
 
         # 启动 Workers
         self.start_workers()
@@ -961,6 +1166,7 @@ class Pipeline:
         batch_count = 0
         total_queued = 0
         start_time = time.time()
+        last_progress = None  # 上次输出的进度，未变化时不重复输出
 
         try:
             while not self.stop_event.is_set():
@@ -969,18 +1175,23 @@ class Pipeline:
                     self.logger.info(f"已达到最大批次数 {self.config.max_batches}")
                     break
 
+                # 先清除补充信号再读取计数，避免错过 Worker 的通知
+                self.refill_event.clear()
+
                 # 检查队列是否需要补充任务
                 # 保持队列中有足够的任务，让 workers 持续工作
-                queue_size = self.task_queue.qsize()
+                # 共享计数每轮只读一次，后续判断和日志复用
+                queue_size = self.queued_count.value
+                completed = self.completed_count.value
 
                 # 当队列中任务少于 chrome_workers * 2 时，补充新任务
-                if queue_size < self.config.chrome_workers * 2:
+                if queue_size < self.refill_threshold:
                     # 获取待处理链接
                     pending = self.get_pending_links(self.config.batch_size)
 
                     if not pending:
                         # 没有新任务了，等待现有任务完成
-                        if queue_size == 0 and len(self.result_dict) >= total_queued:
+                        if queue_size == 0 and completed >= total_queued:
                             self.logger.info("没有更多待处理任务")
                             break
                         else:
@@ -991,58 +1202,51 @@ class Pipeline:
                     batch_count += 1
                     self.logger.info(f"\n===== 补充批次 {batch_count} ({len(pending)} 个任务) =====")
 
-                    # 将任务放入队列（不等待完成）
+                    # 将任务放入队列（不等待完成），先计数以免 Worker 扣减为负
+                    with self.queued_count.get_lock():
+                        self.queued_count.value += len(pending)
                     for link_data in pending:
-                        self.task_queue.put(link_data)
+                        self.task_queues[self.next_task_queue].put(link_data)
+                        self.next_task_queue = (self.next_task_queue + 1) % len(self.task_queues)
 
                     total_queued += len(pending)
-                    self.logger.info(f"队列状态: 已投放 {total_queued}, 已完成 {len(self.result_dict)}")
-
-                # 显示进度（每 10 秒）
-                time.sleep(10)
-
-                completed = len(self.result_dict)
-                elapsed = (time.time() - start_time) / 60
-                rate = completed / elapsed if elapsed > 0 else 0
-
-                # 获取队列状态
-                task_q = self.task_queue.qsize()
-                file_q = self.file_queue.qsize()
-                text_q = self.text_queue.qsize()
-
-                self.logger.info(
-                    f"[进度] 完成: {completed}/{total_queued} | "
-                    f"队列: 爬取={task_q}, 解析={file_q}, 重命名={text_q} | "
-                    f"速率: {rate:.1f}/分钟"
-                )
+                    self.logger.info(f"队列状态: 已投放 {total_queued}, 已完成 {completed}")
+
+                # 等待补充信号（最多 10 秒），队列耗尽时立即进入下一轮补充
+                self.refill_event.wait(timeout=10)
+
+                if self.logger.isEnabledFor(logging.INFO):
+                    progress = (self.completed_count.value, total_queued, self.queued_count.value)
+                    if progress != last_progress:
+                        last_progress = progress
+                        completed, _, queued = progress
+                        elapsed = (time.time() - start_time) / 60
+                        rate = completed / elapsed if elapsed > 0 else 0
+
+                        self.logger.info(
+                            f"[进度] 完成: {completed}/{total_queued} | "
+                            f"待爬取: {queued} | "
+                            f"速率: {rate:.1f}/分钟"
+                        )
 
         except KeyboardInterrupt:
             self.logger.info("用户中断")
 
         finally:
-            # 等待队列处理完
-            self.logger.info("等待剩余任务完成...")
-
-            # 等待所有队列清空
-            wait_count = 0
-            while wait_count < 30:  # 最多等待 5 分钟
-                task_q = self.task_queue.qsize()
-                file_q = self.file_queue.qsize()
-                text_q = self.text_queue.qsize()
-
-                if task_q == 0 and file_q == 0 and text_q == 0:
-                    self.logger.info("所有队列已清空")
-                    break
-
-                self.logger.info(f"等待队列清空: 爬取={task_q}, 解析={file_q}, 重命名={text_q}")
-                time.sleep(10)
-                wait_count += 1
+            # 等待队列处理完（已收到中断信号时 Worker 已停止，不再等待）
+            if not self.stop_event.is_set():
+                self.stop_throttle()  # 收尾阶段不再限流，否则被暂停的 Worker 无法消费剩余任务
+                self.logger.info("等待剩余任务完成...")
+                if self.join_queues(timeout=300):  # 最多等待 5 分钟
+                    self.logger.info("所有任务已处理完毕")
+                else:
+                    self.logger.warning("等待超时，仍有未完成的任务")
 
             self.stop()
 
             # 最终统计
             elapsed = (time.time() - start_time) / 60
-            total_processed = len(self.result_dict)
+            total_processed = self.completed_count.value
             self.logger.info("\n" + "=" * 60)
             self.logger.info("Pipeline 结束")
             self.logger.info(f"总批次: {batch_count}")
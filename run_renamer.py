@@ -10,19 +10,67 @@
 """
 
 import os
+import re
 import sys
 import time
 import signal
+import threading
 import logging
 import argparse
+import hashlib
 from datetime import datetime
-from multiprocessing import Process, Queue, Manager, cpu_count
+import multiprocessing
+from multiprocessing import cpu_count, shared_memory, resource_tracker
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from queue import Empty
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Docling 本身（docling/torch）由 preload_docling 在 fork Worker 前导入
+from processor.pdf_processor import PDFProcessor, preload_docling
+from processor.doc_processor import DocProcessor
+from db.target_db import TargetDatabase
+from storage.supabase_storage import SupabaseStorage
+
+# 非 Windows 平台使用 fork：子进程通过写时复制继承父进程已导入的模块，无需重新导入
+MP_CONTEXT = multiprocessing.get_context('fork' if sys.platform != 'win32' else 'spawn')
+
+# LLM 重命名结果缓存（按文件内容哈希），相同文件重复出现时跳过 LLM 调用
+# 需要安装 diskcache，未安装时不使用缓存
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# 原始文件名已完全符合命名规范时直接采用，不再解析和调用 LLM
+# 规范见 LLMRenamer / AIPmt/Rename.txt:
+# {大学名}_{所属}_{専攻}_{課程}_{年度}_{入学時期}_{文書種別}_{詳細}.{拡張子}
+# 課程、入学時期、文書種別只接受提示词中列出的取值，避免 report_2023_final_v2.pdf 之类的通用文件名被误判
+_NAME_FIELD = r'[^_\s/\\]+'
+ALREADY_RENAMED_RE = re.compile(
+    rf'^{_NAME_FIELD}大学'                 # 大学名
+    rf'_{_NAME_FIELD}_{_NAME_FIELD}'       # 所属、専攻
+    r'_(?:学部|修士|博士)'                  # 課程
+    r'_(?:19|20)\d{2}'                      # 年度（西暦）
+    r'_(?:4月|10月|4月10月)'                # 入学時期
+    r'_(?:募集要項|過去問|解答例|出願書類|入試日程|入試結果|合格発表|広報資料)'  # 文書種別
+    rf'_{_NAME_FIELD}'                     # 詳細
+    r'\.(?:pdf|docx?)$',
+    re.IGNORECASE
+)
+ALREADY_RENAMED_MAX_LEN = 120
+
+RENAME_CACHE_DIR = "cache/llm_rename"
+RENAME_CACHE_TTL = 30 * 24 * 3600  # 30 天
+
+
+def open_rename_cache():
+    """打开重命名缓存（进程安全），未安装 diskcache 时返回 None"""
+    if diskcache is None:
+        return None
+    return diskcache.Cache(RENAME_CACHE_DIR)
+
 # ============================================================
 # 日志配置
 # ============================================================
@@ -47,17 +95,53 @@ def setup_logging(level: str = "INFO"):
 # Docling GPU Worker
 # ============================================================
 
+def build_context(original_url, original_name):
+    """根据文件的原始 URL 和名称构建 LLM 重命名上下文"""
+    return {
+        'url': original_url,
+        'original_name': original_name or '',
+        'breadcrumb': '',
+        'title': original_name or '',
+        'parent_title': '',
+        'school_name': ''
+    }
+
+
+def init_worker_signals():
+    """
+    Worker 进程的信号设置
+
+    fork 出的子进程会继承主进程的信号处理函数：忽略 SIGINT，只由主进程处理并下发停止信号；
+    SIGTERM 恢复默认行为，主进程 terminate() 时直接退出
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def attach_shared_memory(name):
+    """
+    附加到主进程创建的共享内存
+
+    共享内存由主进程创建并负责 unlink，Worker 只读取后 close；
+    附加时不登记到 Worker 自己的 resource_tracker，否则退出时会被误当作泄漏清理
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 不支持 track 参数
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
 def docling_worker(worker_id, file_queue, text_queue, config, stop_event):
     """Docling GPU Worker - PDF 解析"""
+    init_worker_signals()
     logger = logging.getLogger(f"Docling-{worker_id}")
     logger.info(f"Docling Worker {worker_id} 启动")
 
     if config['use_gpu']:
         os.environ['CUDA_VISIBLE_DEVICES'] = '0'
 
-    from processor.pdf_processor import PDFProcessor
-    from processor.doc_processor import DocProcessor
-
     pdf_processor = PDFProcessor(
         max_pages=config['max_pages'],
         use_docling=config['use_docling'],
@@ -70,23 +154,33 @@ def docling_worker(worker_id, file_queue, text_queue, config, stop_event):
     while not stop_event.is_set():
         try:
             file_task = file_queue.get(timeout=10)
+        except Empty:
+            continue
 
+        try:
             if file_task is None:
                 logger.info(f"Docling Worker {worker_id} 收到停止信号")
                 break
 
-            file_id = file_task['file_id']
-            local_path = file_task['local_path']
+            # file_queue 中只传基础类型元组，上下文在这里重建
+            file_id, task_id, shm_name, size, content_hash, file_name, original_url, original_name = file_task
 
             logger.info(f"[Docling-{worker_id}] 开始解析 file_id={file_id}")
 
+            # 从共享内存读取文件内容，读完即关闭映射（unlink 由主进程在本批处理完后执行）
+            shm = attach_shared_memory(shm_name)
+            try:
+                data = bytes(shm.buf[:size])
+            finally:
+                shm.close()
+
             start_time = time.time()
-            ext = os.path.splitext(local_path)[1].lower()
+            ext = os.path.splitext(file_name)[1].lower()
 
             if ext == '.pdf':
-                result = pdf_processor.extract_text(local_path)
+                result = pdf_processor.extract_text_from_bytes(data)
             elif ext in ['.doc', '.docx']:
-                result = doc_processor.extract_text(local_path)
+                result = doc_processor.extract_text_from_bytes(data, ext)
             else:
                 result = type('obj', (object,), {
                     'success': False, 'text': '', 'error_message': f'不支持的文件类型: {ext}'
@@ -96,12 +190,13 @@ def docling_worker(worker_id, file_queue, text_queue, config, stop_event):
 
             text_result = {
                 'file_id': file_id,
-                'task_id': file_task['task_id'],
+                'task_id': task_id,
                 'success': result.success,
                 'text': result.text if result.success else None,
                 'error_message': result.error_message if not result.success else None,
-                'context': file_task['context'],
-                'local_path': local_path,
+                'context': build_context(original_url, original_name),
+                'file_name': file_name,
+                'content_hash': content_hash,
                 'extract_time': extract_time
             }
             text_queue.put(text_result)
@@ -109,13 +204,14 @@ def docling_worker(worker_id, file_queue, text_queue, config, stop_event):
             processed_count += 1
             logger.info(f"[Docling-{worker_id}] 解析完成 file_id={file_id}, 耗时={extract_time:.1f}s")
 
-        except Empty:
-            continue
         except Exception as e:
             logger.error(f"[Docling-{worker_id}] 错误: {e}")
             import traceback
             traceback.print_exc()
             continue
+        finally:
+            # 解析结果已放入 text_queue 后才标记完成，主进程 join 时不会漏掉
+            file_queue.task_done()
 
     logger.info(f"Docling Worker {worker_id} 退出, 共处理 {processed_count} 个文件")
 
@@ -126,11 +222,11 @@ def docling_worker(worker_id, file_queue, text_queue, config, stop_event):
 
 def llm_worker(text_queue, config, stop_event):
     """LLM 重命名 Worker"""
+    init_worker_signals()
     logger = logging.getLogger("LLM-Pool")
     logger.info(f"LLM Worker 启动, 线程数={config['llm_workers']}")
 
     import Sdata
-    from db.target_db import TargetDatabase
     from processor.llm_renamer import LLMRenamer
 
     target_db = TargetDatabase()
@@ -140,8 +236,44 @@ def llm_worker(text_queue, config, stop_event):
     renamer.connect()
     renamer.load_prompt_template()
 
+    rename_cache = open_rename_cache()
+
     processed_count = 0
 
+    # 重命名成功的结果先累积，满 50 条或超过 2 秒再批量写入数据库
+    # 写入后才对 text_queue 调用 task_done，主进程 join 返回时结果已落库
+    flush_size = 50
+    flush_interval = 2
+    pending_updates = []
+    last_flush = time.time()
+
+    def flush_updates():
+        nonlocal last_flush
+        last_flush = time.time()
+        if not pending_updates:
+            return
+        try:
+            target_db.batch_update_files_renamed(pending_updates)
+        except Exception as e:
+            logger.error(f"[LLM] 批量写入 {len(pending_updates)} 条重命名结果失败: {e}")
+        for _ in pending_updates:
+            text_queue.task_done()
+        pending_updates.clear()
+
+    def handle_done(future, file_id):
+        nonlocal processed_count
+        try:
+            result = future.result()
+            processed_count += 1
+            if result['success']:
+                pending_updates.append(result['update'])
+                logger.info(f"[LLM] 重命名成功 file_id={file_id}: {result.get('renamed_name', '')}")
+                return
+            logger.warning(f"[LLM] 重命名失败 file_id={file_id}: {result.get('error', '')}")
+        except Exception as e:
+            logger.error(f"[LLM] 处理错误 file_id={file_id}: {e}")
+        text_queue.task_done()
+
     def process_single(text_result):
         file_id = text_result['file_id']
 
@@ -156,22 +288,26 @@ def llm_worker(text_queue, config, stop_event):
             rename_result = renamer.rename_from_text(
                 text_result['text'],
                 text_result['context'],
-                os.path.splitext(text_result['local_path'])[1]
+                os.path.splitext(text_result['file_name'])[1]
             )
 
             if rename_result.success and rename_result.renamed_name:
-                target_db.update_file_renamed(
-                    file_id,
-                    renamed_name=rename_result.renamed_name,
-                    llm_model=renamer.model,
-                    llm_confidence=rename_result.confidence,
-                    llm_raw_response=rename_result.raw_response
-                )
+                update = {
+                    'file_id': file_id,
+                    'renamed_name': rename_result.renamed_name,
+                    'llm_model': renamer.model,
+                    'llm_confidence': rename_result.confidence,
+                    'llm_raw_response': rename_result.raw_response
+                }
+
+                if rename_cache is not None:
+                    rename_cache.set(text_result['content_hash'], update, expire=RENAME_CACHE_TTL)
 
                 return {
                     'file_id': file_id,
                     'success': True,
-                    'renamed_name': rename_result.renamed_name
+                    'renamed_name': rename_result.renamed_name,
+                    'update': update
                 }
             else:
                 return {
@@ -186,12 +322,6 @@ def llm_worker(text_queue, config, stop_event):
                 'success': False,
                 'error': str(e)
             }
-        finally:
-            try:
-                if os.path.exists(text_result['local_path']):
-                    os.remove(text_result['local_path'])
-            except:
-                pass
 
     with ThreadPoolExecutor(max_workers=config['llm_workers']) as executor:
         futures = {}
@@ -202,6 +332,7 @@ def llm_worker(text_queue, config, stop_event):
                     text_result = text_queue.get(timeout=2)
 
                     if text_result is None:
+                        text_queue.task_done()
                         logger.info("LLM Worker 收到停止信号")
                         break
 
@@ -213,16 +344,10 @@ def llm_worker(text_queue, config, stop_event):
 
                 done_futures = [f for f in futures if f.done()]
                 for future in done_futures:
-                    file_id = futures.pop(future)
-                    try:
-                        result = future.result()
-                        processed_count += 1
-                        if result['success']:
-                            logger.info(f"[LLM] 重命名成功 file_id={file_id}: {result.get('renamed_name', '')}")
-                        else:
-                            logger.warning(f"[LLM] 重命名失败 file_id={file_id}: {result.get('error', '')}")
-                    except Exception as e:
-                        logger.error(f"[LLM] 处理错误 file_id={file_id}: {e}")
+                    handle_done(future, futures.pop(future))
+
+                if len(pending_updates) >= flush_size or time.time() - last_flush >= flush_interval:
+                    flush_updates()
 
             except Exception as e:
                 logger.error(f"[LLM] 主循环错误: {e}")
@@ -230,13 +355,12 @@ def llm_worker(text_queue, config, stop_event):
 
         logger.info(f"等待剩余 {len(futures)} 个 LLM 任务完成...")
         for future in as_completed(futures):
-            try:
-                result = future.result()
-                processed_count += 1
-            except:
-                pass
+            handle_done(future, futures[future])
+        flush_updates()
 
     target_db.close()
+    if rename_cache is not None:
+        rename_cache.close()
     logger.info(f"LLM Worker 退出, 共处理 {processed_count} 个文件")
 
 
@@ -257,13 +381,20 @@ class Renamer:
         self.batch_size = batch_size
 
         self.logger = setup_logging()
-        self.manager = Manager()
-        self.file_queue = Queue()
-        self.text_queue = Queue()
-        self.stop_event = self.manager.Event()
+        self.file_queue = MP_CONTEXT.JoinableQueue()
+        self.text_queue = MP_CONTEXT.JoinableQueue()
+        self.stop_event = MP_CONTEXT.Event()
         self.docling_processes = []
         self.llm_process = None
 
+        # 从 Storage 并发下载待处理文件，共用一个 Storage 客户端（在 run 中连接）
+        self.download_executor = ThreadPoolExecutor(max_workers=min(batch_size, 16),
+                                                    thread_name_prefix="Download")
+        self.storage = None
+        self.target_db = None
+        self.rename_cache = None
+        self.shm_blocks = {}  # 主进程创建、尚未 unlink 的共享内存 {name: SharedMemory}
+
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
 
@@ -280,8 +411,11 @@ class Renamer:
         }
 
         self.logger.info(f"启动 {self.docling_workers} 个 Docling Worker...")
+        # 主进程先导入 docling（不触碰 CUDA），Worker fork 后直接继承，省去各自的导入耗时
+        if self.use_docling and not preload_docling():
+            self.logger.warning("未安装 docling，将回退到 pdfplumber")
         for i in range(self.docling_workers):
-            p = Process(
+            p = MP_CONTEXT.Process(
                 target=docling_worker,
                 args=(i, self.file_queue, self.text_queue, config, self.stop_event),
                 name=f"Docling-{i}"
@@ -291,7 +425,7 @@ class Renamer:
             time.sleep(1)
 
         self.logger.info(f"启动 LLM Worker (线程数={self.llm_workers})...")
-        self.llm_process = Process(
+        self.llm_process = MP_CONTEXT.Process(
             target=llm_worker,
             args=(self.text_queue, config, self.stop_event),
             name="LLM-Pool"
@@ -308,26 +442,60 @@ class Renamer:
             self.file_queue.put(None)
         self.text_queue.put(None)
 
-        for p in self.docling_processes:
-            p.join(timeout=30)
-        if self.llm_process:
-            self.llm_process.join(timeout=30)
+        # 所有进程共用 30 秒的等待时间，超时后强制结束，退出时间不随 Worker 数增长
+        processes = self.docling_processes + ([self.llm_process] if self.llm_process else [])
+        deadline = time.time() + 30
+        for p in processes:
+            p.join(timeout=max(0, deadline - time.time()))
+
+        for p in processes:
+            if p.is_alive():
+                self.logger.warning(f"{p.name} 未能按时退出，强制结束")
+                p.terminate()
+                p.join(timeout=5)
+                if p.is_alive():
+                    p.kill()
+                    p.join()
 
         self.logger.info("所有 Worker 已停止")
 
-    def get_pending_files(self, limit):
-        """获取已下载但未重命名的文件"""
-        from db.target_db import TargetDatabase
-        from storage.supabase_storage import SupabaseStorage
-
-        target_db = TargetDatabase()
-        target_db.connect()
-
-        # 获取状态为 downloaded 的文件
-        files = target_db.get_files_by_status('downloaded', limit=limit)
+    def close(self):
+        """关闭数据库连接和重命名缓存，须在 run() 不再使用它们之后调用"""
+        if self.target_db:
+            self.target_db.close()
+            self.target_db = None
+        if self.rename_cache is not None:
+            self.rename_cache.close()
+            self.rename_cache = None
+
+    def wait_for_queues(self):
+        """
+        等待已入队的文件全部解析、重命名完毕
+
+        JoinableQueue.join() 无法中断，这里在后台线程中等待，收到停止信号时提前返回
+        """
+        def join_all():
+            # 解析结果放入 text_queue 后才对 file_queue 调用 task_done，按顺序 join 即可
+            self.file_queue.join()
+            self.text_queue.join()
+
+        waiter = threading.Thread(target=join_all, name="QueueJoin", daemon=True)
+        waiter.start()
+        while waiter.is_alive() and not self.stop_event.is_set():
+            waiter.join(timeout=5)
+
+    def get_pending_files(self, limit, exclude_ids=None):
+        """获取已下载但未重命名的文件（跳过 exclude_ids 中仍在处理的文件）"""
+        # 获取状态为 downloaded 的文件，多取出仍在处理中的数量，过滤后凑满一批
+        exclude_ids = exclude_ids or set()
+        files = self.target_db.get_files_by_status('downloaded', limit=limit + len(exclude_ids))
 
         result = []
         for f in files:
+            if f.id in exclude_ids:
+                continue
+            if len(result) >= limit:
+                break
             result.append({
                 'file_id': f.id,
                 'task_id': f.task_id,
@@ -337,29 +505,65 @@ class Renamer:
                 'file_extension': f.file_extension
             })
 
-        target_db.close()
         return result
 
-    def download_file_from_storage(self, storage_path, task_id):
-        """从 Supabase Storage 下载文件到本地"""
-        from storage.supabase_storage import SupabaseStorage
-
-        storage = SupabaseStorage(is_public=False)
-        storage.connect()
-
-        local_dir = f"temp_downloads/task_{task_id}"
-        os.makedirs(local_dir, exist_ok=True)
-
-        filename = os.path.basename(storage_path)
-        local_path = os.path.join(local_dir, filename)
+    def download_to_shared_memory(self, storage_path):
+        """
+        从 Supabase Storage 下载文件到共享内存（不落盘），由 Docling Worker 读取后释放
 
+        Returns:
+            (共享内存名称, 字节数, 内容哈希)，命中重命名缓存时共享内存名称为 None；失败返回 None
+        """
         try:
-            storage.download_file(storage_path, local_path)
-            return local_path
+            data = self.storage.download_bytes(storage_path)
         except Exception as e:
             self.logger.error(f"下载文件失败: {e}")
             return None
 
+        content_hash = hashlib.sha256(data).hexdigest()
+        if self.rename_cache is not None and content_hash in self.rename_cache:
+            return None, len(data), content_hash
+
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        shm.close()
+        self.shm_blocks[shm.name] = shm
+        return shm.name, len(data), content_hash
+
+    def release_shared_memory(self, names=None):
+        """unlink 主进程创建的共享内存（names 为 None 时释放全部），须在 Worker 读取完之后调用"""
+        if names is None:
+            names = list(self.shm_blocks)
+        for name in names:
+            shm = self.shm_blocks.pop(name, None)
+            if shm is None:
+                continue
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def is_already_renamed(original_name):
+        """原始文件名是否已符合命名规范"""
+        return bool(original_name) and len(original_name) <= ALREADY_RENAMED_MAX_LEN \
+            and ALREADY_RENAMED_RE.match(original_name) is not None
+
+    def apply_cached_rename(self, file_id, content_hash):
+        """使用缓存的重命名结果更新数据库，缓存已过期时返回 False"""
+        cached = self.rename_cache.get(content_hash)
+        if not cached:
+            return False
+
+        self.target_db.update_file_renamed(
+            file_id,
+            renamed_name=cached['renamed_name'],
+            llm_model=cached['llm_model'],
+            llm_confidence=cached['llm_confidence'],
+            llm_raw_response=cached['llm_raw_response']
+        )
+        return True
+
     def run(self):
         self.logger.info("=" * 60)
         self.logger.info("重命名脚本启动（只做 PDF 解析和 LLM 重命名）")
@@ -371,53 +575,96 @@ class Renamer:
 
         self.start_workers()
 
+        # 连接在 Worker 启动后建立，避免 fork 时子进程继承父进程的连接
+        self.storage = SupabaseStorage(is_public=False)
+        self.storage.connect()
+        self.target_db = TargetDatabase()
+        self.target_db.connect()
+        self.rename_cache = open_rename_cache()
+
         total_processed = 0
+        cache_hits = 0
+        skipped_files = 0
         start_time = time.time()
+        in_flight_ids = set()  # 上一批已入队、仍在处理中的文件
+        in_flight_shm = []     # 上一批文件占用的共享内存
 
         try:
             while not self.stop_event.is_set():
-                # 获取待处理文件
-                pending_files = self.get_pending_files(self.batch_size)
+                # 获取下一批待处理文件（上一批仍在 Worker 中处理，与之重叠）
+                pending_files = self.get_pending_files(self.batch_size, exclude_ids=in_flight_ids)
 
                 if not pending_files:
                     self.logger.info("没有更多待重命名的文件")
                     break
 
-                self.logger.info(f"\n===== 处理 {len(pending_files)} 个文件 =====")
-
-                # 下载文件并放入队列
-                for file_info in pending_files:
+                # 原始文件名已符合命名规范的文件直接完成，不下载也不解析
+                named_files = [f for f in pending_files if self.is_already_renamed(f['original_name'])]
+                if named_files:
+                    # 未经 LLM 处理，llm_processed 保持 FALSE，之后仍可按此条件重新处理
+                    self.target_db.batch_update_files_renamed([{
+                        'file_id': f['file_id'],
+                        'renamed_name': f['original_name'],
+                        'llm_model': None,
+                        'llm_confidence': None,
+                        'llm_raw_response': None
+                    } for f in named_files], llm_processed=False)
+                    skipped_files += len(named_files)
+                    self.logger.info(f"[跳过] {len(named_files)} 个文件的原始文件名已符合命名规范")
+                    named_ids = {f['file_id'] for f in named_files}
+                    pending_files = [f for f in pending_files if f['file_id'] not in named_ids]
+
+                self.logger.info(f"\n===== 预取 {len(pending_files)} 个文件 =====")
+
+                # 并发下载下一批，同时上一批在 Worker 中继续处理
+                file_tasks = []
+                futures = {
+                    self.download_executor.submit(
+                        self.download_to_shared_memory,
+                        file_info['storage_path']
+                    ): file_info
+                    for file_info in pending_files
+                }
+                for future in as_completed(futures):
+                    file_info = futures[future]
                     try:
-                        # 从 Storage 下载
-                        local_path = self.download_file_from_storage(
-                            file_info['storage_path'],
-                            file_info['task_id']
-                        )
-
-                        if local_path:
-                            file_task = {
-                                'file_id': file_info['file_id'],
-                                'task_id': file_info['task_id'],
-                                'local_path': local_path,
-                                'context': {
-                                    'url': file_info['original_url'],
-                                    'original_name': file_info['original_name'] or '',
-                                    'breadcrumb': '',
-                                    'title': file_info['original_name'] or '',
-                                    'parent_title': '',
-                                    'school_name': ''
-                                }
-                            }
-                            self.file_queue.put(file_task)
-                            total_processed += 1
+                        downloaded = future.result()
+
+                        if downloaded:
+                            shm_name, size, content_hash = downloaded
+                            if shm_name is None:
+                                if self.apply_cached_rename(file_info['file_id'], content_hash):
+                                    cache_hits += 1
+                                    self.logger.info(f"[缓存] 命中 file_id={file_info['file_id']}")
+                                continue
+
+                            file_tasks.append((
+                                file_info['file_id'],
+                                file_info['task_id'],
+                                shm_name,
+                                size,
+                                content_hash,
+                                os.path.basename(file_info['storage_path']),
+                                file_info['original_url'],
+                                file_info['original_name']
+                            ))
 
                     except Exception as e:
                         self.logger.error(f"处理文件失败: {e}")
 
-                # 等待处理完成
-                while self.file_queue.qsize() > 0 or self.text_queue.qsize() > 0:
-                    time.sleep(5)
-                    self.logger.info(f"队列状态: 解析={self.file_queue.qsize()}, 重命名={self.text_queue.qsize()}")
+                # 最多两批在途：上一批处理完后再放入下一批
+                if in_flight_ids:
+                    self.wait_for_queues()
+                    # 上一批已全部解析完毕，释放其共享内存（提前返回的停止情况留给 finally 处理）
+                    if not self.stop_event.is_set():
+                        self.release_shared_memory(in_flight_shm)
+
+                for file_task in file_tasks:
+                    self.file_queue.put(file_task)
+                in_flight_ids = {t[0] for t in file_tasks}
+                in_flight_shm = [t[2] for t in file_tasks]
+                total_processed += len(file_tasks)
+                self.logger.info(f"===== 开始处理 {len(file_tasks)} 个文件 =====")
 
                 elapsed = (time.time() - start_time) / 60
                 rate = total_processed / elapsed if elapsed > 0 else 0
@@ -428,13 +675,19 @@ class Renamer:
 
         finally:
             self.logger.info("等待剩余任务完成...")
-            time.sleep(10)
+            self.download_executor.shutdown(wait=True)
+            self.wait_for_queues()
             self.stop()
+            # Worker 已全部退出，释放剩余的共享内存
+            self.release_shared_memory()
+            self.close()
 
             elapsed = (time.time() - start_time) / 60
             self.logger.info("\n" + "=" * 60)
             self.logger.info("重命名脚本结束")
             self.logger.info(f"总处理: {total_processed}")
+            self.logger.info(f"缓存命中: {cache_hits}")
+            self.logger.info(f"原名直接采用: {skipped_files}")
             self.logger.info(f"总耗时: {elapsed:.1f} 分钟")
             self.logger.info("=" * 60)
 
@@ -453,17 +706,15 @@ def main():
     args = parser.parse_args()
 
     if args.status:
-        from db.target_db import TargetDatabase
-
         target_db = TargetDatabase()
         target_db.connect()
 
-        completed = len(target_db.get_tasks_by_status('completed'))
-        downloaded = len(target_db.get_tasks_by_status('downloaded'))
+        completed = target_db.count_tasks_by_status('completed')
+        downloaded = target_db.count_tasks_by_status('downloaded')
 
         # 获取文件统计
-        downloaded_files = len(target_db.get_files_by_status('downloaded'))
-        renamed_files = len(target_db.get_files_by_status('completed'))
+        downloaded_files = target_db.count_files_by_status(download_status='downloaded', process_status='pending')
+        renamed_files = target_db.count_files_by_status(process_status='completed')
 
         print(f"""
 ========== 重命名进度 ==========
@@ -4,13 +4,28 @@
 """
 
 import os
+import re
 import time
+import hashlib
+import logging
+import tempfile
+import functools
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlparse, unquote
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from typing import Optional, List, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# mkstemp 创建的临时文件权限为 0600，改名前按当前 umask 恢复为普通文件的默认权限
+# umask 只能通过设置来读取，在导入时（尚无其他线程）读取一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
 
 
 @dataclass
@@ -30,8 +45,13 @@ class FileDownloader:
     """文件下载器"""
 
     SUPPORTED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.xls', '.xlsx']
+    _SUPPORTED_SUFFIXES = tuple(SUPPORTED_EXTENSIONS)  # 供 str.endswith 一次匹配
     DEFAULT_TIMEOUT = 60  # 秒
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    CHUNK_SIZE = 256 * 1024  # 流式读取的块大小（大块减少 Python 层迭代次数）
+
+    # 处理 filename="xxx.pdf" 或 filename*=UTF-8''xxx.pdf
+    _CONTENT_DISPOSITION_RE = re.compile(r'filename\*?=(?:UTF-8\'\')?["\']?([^"\';]+)')
 
     def __init__(self, download_dir: str = "./temp_downloads",
                  timeout: int = None, max_size: int = None):
@@ -57,15 +77,34 @@ class FileDownloader:
             'Accept-Language': 'ja,en;q=0.9,zh;q=0.8',
         }
 
-    def _get_filename_from_url(self, url: str) -> str:
-        """从URL提取文件名"""
+        # 复用连接（Keep-Alive），同一站点的多次下载不再重复 TCP/TLS 握手
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # 批量下载时各站点线程并行选取文件名，去重需加锁
+        self._reserve_lock = threading.Lock()
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _get_filename_from_url(url: str) -> str:
+        """从URL提取文件名（纯函数，结果缓存）"""
         parsed = urlparse(url)
         path = unquote(parsed.path)
         filename = os.path.basename(path)
 
         # 如果没有文件名，使用URL哈希
         if not filename or '.' not in filename:
-            import hashlib
             filename = hashlib.md5(url.encode()).hexdigest()[:16]
 
         return filename
@@ -74,20 +113,20 @@ class FileDownloader:
         """从响应头提取文件名"""
         content_disposition = headers.get('Content-Disposition', '')
         if 'filename=' in content_disposition:
-            # 处理 filename="xxx.pdf" 或 filename*=UTF-8''xxx.pdf
-            import re
-            match = re.search(r'filename\*?=(?:UTF-8\'\')?["\']?([^"\';]+)', content_disposition)
+            match = self._CONTENT_DISPOSITION_RE.search(content_disposition)
             if match:
                 return unquote(match.group(1))
         return None
 
-    def _get_extension(self, url: str, content_type: str = None) -> str:
-        """获取文件扩展名"""
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _get_extension(url: str, content_type: str = None) -> str:
+        """获取文件扩展名（纯函数，结果缓存）"""
         # 先从URL获取
-        filename = self._get_filename_from_url(url)
-        for ext in self.SUPPORTED_EXTENSIONS:
-            if filename.lower().endswith(ext):
-                return ext
+        filename = FileDownloader._get_filename_from_url(url)
+        ext = os.path.splitext(filename.lower())[1]
+        if ext in FileDownloader._SUPPORTED_SUFFIXES:
+            return ext
 
         # 从 Content-Type 推断
         if content_type:
@@ -108,6 +147,10 @@ class FileDownloader:
         """
         获取文件信息（不下载）
 
+        发起流式 GET，收到响应头后立即关闭，不读取响应体。
+        download_file / download_to_memory 已在同一个 GET 响应上检查文件大小，
+        下载前无需先调用本方法。
+
         Args:
             url: 文件URL
 
@@ -115,18 +158,30 @@ class FileDownloader:
             (文件大小, Content-Type) 或 (None, None) 如果失败
         """
         try:
-            response = requests.head(url, headers=self.headers,
-                                     timeout=10, allow_redirects=True)
-            if response.status_code == 200:
-                size = response.headers.get('Content-Length')
-                content_type = response.headers.get('Content-Type')
-                return int(size) if size else None, content_type
+            with self.session.get(url, timeout=10, stream=True, allow_redirects=True) as response:
+                if response.status_code == 200:
+                    size = response.headers.get('Content-Length')
+                    content_type = response.headers.get('Content-Type')
+                    return int(size) if size else None, content_type
         except Exception:
             pass
         return None, None
 
+    def _reserve_filename(self, filename: str, reserved_names: set) -> str:
+        """在同一批下载中为文件名去重（重名时追加 _1、_2 ...），并登记为已占用"""
+        with self._reserve_lock:
+            stem, ext = os.path.splitext(filename)
+            candidate = filename
+            n = 1
+            while candidate in reserved_names:
+                candidate = f"{stem}_{n}{ext}"
+                n += 1
+            reserved_names.add(candidate)
+            return candidate
+
     def download_file(self, url: str, save_name: str = None,
-                      task_folder: str = None) -> DownloadResult:
+                      task_folder: str = None,
+                      reserved_names: Optional[set] = None) -> DownloadResult:
         """
         下载单个文件
 
@@ -134,6 +189,7 @@ class FileDownloader:
             url: 文件URL
             save_name: 保存的文件名（不含路径）
             task_folder: 任务子文件夹名
+            reserved_names: 同一批下载已占用的文件名集合，传入时对文件名去重
 
         Returns:
             DownloadResult
@@ -147,12 +203,12 @@ class FileDownloader:
             os.makedirs(save_dir, exist_ok=True)
 
             # 发起请求
-            print(f"[Download] 开始下载: {url[:80]}...")
-            response = requests.get(url, headers=self.headers,
-                                    timeout=self.timeout, stream=True,
-                                    allow_redirects=True)
+            logger.debug(f"[Download] 开始下载: {url[:80]}...")
+            response = self.session.get(url, timeout=self.timeout, stream=True,
+                                        allow_redirects=True)
 
             if response.status_code != 200:
+                response.close()  # 归还连接
                 return DownloadResult(
                     success=False,
                     url=url,
@@ -165,6 +221,7 @@ class FileDownloader:
             # 检查文件大小
             content_length = response.headers.get('Content-Length')
             if content_length and int(content_length) > self.max_size:
+                response.close()
                 return DownloadResult(
                     success=False,
                     url=url,
@@ -184,33 +241,55 @@ class FileDownloader:
 
             # 确保有正确的扩展名
             ext = self._get_extension(url, response.headers.get('Content-Type'))
-            if not any(filename.lower().endswith(e) for e in self.SUPPORTED_EXTENSIONS):
+            if not filename.lower().endswith(self._SUPPORTED_SUFFIXES):
                 filename += ext
 
-            # 保存文件
+            if reserved_names is not None:
+                filename = self._reserve_filename(filename, reserved_names)
+
+            # 保存文件：先写入唯一的 .part 临时文件，完成后再改名，出错时不留下不完整的文件
+            # 临时文件名由 mkstemp 生成，并行下载同名文件时不会互相覆盖
             local_path = os.path.join(save_dir, filename)
+            fd, tmp_path = tempfile.mkstemp(dir=save_dir, prefix='.', suffix='.part')
             file_size = 0
-
-            with open(local_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        file_size += len(chunk)
-
-                        # 检查是否超过大小限制
-                        if file_size > self.max_size:
-                            f.close()
-                            os.remove(local_path)
-                            return DownloadResult(
-                                success=False,
-                                url=url,
-                                local_path=None,
-                                file_size=file_size,
-                                file_name=filename,
-                                error_message=f"文件过大: {file_size / 1024 / 1024:.1f}MB"
-                            )
-
-            print(f"[Download] 完成: {filename} ({file_size / 1024:.1f}KB)")
+            too_large = False
+
+            try:
+                with os.fdopen(fd, 'wb', buffering=1024 * 1024) as f:
+                    # 顺序写入，提示内核尽早回收页缓存
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+                    for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            file_size += len(chunk)
+
+                            # 检查是否超过大小限制
+                            if file_size > self.max_size:
+                                too_large = True
+                                break
+
+                if too_large:
+                    response.close()
+                    os.remove(tmp_path)
+                    return DownloadResult(
+                        success=False,
+                        url=url,
+                        local_path=None,
+                        file_size=file_size,
+                        file_name=filename,
+                        error_message=f"文件过大: {file_size / 1024 / 1024:.1f}MB"
+                    )
+
+                os.chmod(tmp_path, FILE_MODE)
+                os.replace(tmp_path, local_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            logger.info(f"[Download] 完成: {filename} ({file_size / 1024:.1f}KB)")
 
             return DownloadResult(
                 success=True,
@@ -260,12 +339,12 @@ class FileDownloader:
             DownloadResult (file_data 包含文件字节数据)
         """
         try:
-            print(f"[Download] 开始下载到内存: {url[:80]}...")
-            response = requests.get(url, headers=self.headers,
-                                    timeout=self.timeout, stream=True,
-                                    allow_redirects=True)
+            logger.debug(f"[Download] 开始下载到内存: {url[:80]}...")
+            response = self.session.get(url, timeout=self.timeout, stream=True,
+                                        allow_redirects=True)
 
             if response.status_code != 200:
+                response.close()  # 归还连接
                 return DownloadResult(
                     success=False,
                     url=url,
@@ -278,6 +357,7 @@ class FileDownloader:
             # 检查文件大小
             content_length = response.headers.get('Content-Length')
             if content_length and int(content_length) > self.max_size:
+                response.close()
                 return DownloadResult(
                     success=False,
                     url=url,
@@ -297,15 +377,15 @@ class FileDownloader:
 
             # 确保有正确的扩展名
             ext = self._get_extension(url, content_type)
-            if not any(filename.lower().endswith(e) for e in self.SUPPORTED_EXTENSIONS):
+            if not filename.lower().endswith(self._SUPPORTED_SUFFIXES):
                 filename += ext
 
-            # 读取到内存
-            chunks = []
+            # 读取到内存：已知大小时预分配缓冲区，原地写入各个数据块
+            buffer = bytearray(int(content_length) if content_length else 0)
             file_size = 0
-            for chunk in response.iter_content(chunk_size=8192):
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
                 if chunk:
-                    chunks.append(chunk)
+                    buffer[file_size:file_size + len(chunk)] = chunk
                     file_size += len(chunk)
 
                     if file_size > self.max_size:
@@ -318,8 +398,9 @@ class FileDownloader:
                             error_message=f"文件过大: {file_size / 1024 / 1024:.1f}MB"
                         )
 
-            file_data = b''.join(chunks)
-            print(f"[Download] 完成: {filename} ({file_size / 1024:.1f}KB)")
+            del buffer[file_size:]  # 实际数据少于 Content-Length 时截断
+            file_data = bytes(buffer)
+            logger.info(f"[Download] 完成: {filename} ({file_size / 1024:.1f}KB)")
 
             return DownloadResult(
                 success=True,
@@ -360,39 +441,59 @@ class FileDownloader:
             )
 
     def batch_download(self, urls: List[str], task_folder: str = None,
-                       delay: float = 1.0) -> List[DownloadResult]:
+                       delay: float = 1.0, max_workers: int = 16) -> List[DownloadResult]:
         """
         批量下载文件
 
+        不同站点并行下载，同一站点内串行并保持请求间隔
+
         Args:
             urls: URL列表
             task_folder: 任务子文件夹名
-            delay: 请求间隔(秒)，避免被封
+            delay: 同一站点的请求间隔(秒)，避免被封
+            max_workers: 最多同时下载的站点数
 
         Returns:
-            DownloadResult列表
+            DownloadResult列表（与 urls 顺序一致）
         """
-        results = []
         total = len(urls)
+        results: List[Optional[DownloadResult]] = [None] * total
+        if not urls:
+            return []
 
+        # 按站点分组
+        by_host: Dict[str, List[Tuple[int, str]]] = {}
         for i, url in enumerate(urls):
-            print(f"[Download] 进度: {i + 1}/{total}")
-            result = self.download_file(url, task_folder=task_folder)
-            results.append(result)
-
-            # 添加延迟，避免被封
-            if i < total - 1:
-                time.sleep(delay)
+            by_host.setdefault(urlparse(url).netloc, []).append((i, url))
+
+        done = 0
+        lock = threading.Lock()
+        reserved_names = set()  # 本批已占用的文件名，不同站点的同名文件不会写到同一路径
+
+        def download_host(items: List[Tuple[int, str]]):
+            nonlocal done
+            for n, (i, url) in enumerate(items):
+                # 添加延迟，避免被封
+                if n > 0:
+                    time.sleep(delay)
+                results[i] = self.download_file(url, task_folder=task_folder,
+                                                reserved_names=reserved_names)
+                with lock:
+                    done += 1
+                    logger.debug(f"[Download] 进度: {done}/{total}")
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(by_host))) as executor:
+            list(executor.map(download_host, by_host.values()))
 
         success_count = sum(1 for r in results if r.success)
-        print(f"[Download] 批量下载完成: {success_count}/{total} 成功")
+        logger.info(f"[Download] 批量下载完成: {success_count}/{total} 成功")
 
         return results
 
     def is_supported_file(self, url: str) -> bool:
         """检查URL是否为支持的文件类型"""
         url_lower = url.lower()
-        return any(url_lower.endswith(ext) for ext in self.SUPPORTED_EXTENSIONS)
+        return url_lower.endswith(self._SUPPORTED_SUFFIXES)
 
     def cleanup_temp_files(self, task_folder: str = None):
         """
@@ -407,16 +508,17 @@ class FileDownloader:
             path = os.path.join(self.download_dir, task_folder)
             if os.path.exists(path):
                 shutil.rmtree(path)
-                print(f"[Download] 已清理: {path}")
+                logger.info(f"[Download] 已清理: {path}")
         else:
             if os.path.exists(self.download_dir):
                 shutil.rmtree(self.download_dir)
                 os.makedirs(self.download_dir)
-                print(f"[Download] 已清理所有临时文件")
+                logger.info(f"[Download] 已清理所有临时文件")
 
 
 # 测试代码
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     downloader = FileDownloader()
 
     # 测试URL (替换为实际的测试URL)
@@ -4,9 +4,97 @@ Supabase Storage 操作模块
 """
 
 from supabase import create_client, Client
-from typing import Optional, List
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Dict
 import os
+import hashlib
+import tempfile
 import mimetypes
+import threading
+import time
+from urllib.parse import quote
+
+import httpx
+
+from .downloader import FILE_MODE
+
+try:
+    from supabase import ClientOptions
+except ImportError:  # 旧版本 SDK
+    ClientOptions = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖此包
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 存储桶允许的文件类型，按扩展名直接查表，未命中时才交给 mimetypes
+_EXT_MIME = {
+    '.pdf': 'application/pdf',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xls': 'application/vnd.ms-excel',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.html': 'text/html',
+}
+
+
+def guess_content_type(path: str) -> str:
+    """根据文件扩展名推断 MIME 类型"""
+    content_type = _EXT_MIME.get(os.path.splitext(path)[1].lower())
+    if content_type is None:
+        content_type, _ = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def _file_md5(path: str) -> str:
+    """分块计算文件 MD5 (与 Storage 单次上传对象的 ETag 一致)"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 进程内共享的 HTTP 客户端，所有 SupabaseStorage 实例复用同一个连接池
+HTTP_POOL_SIZE = 32
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    获取进程内共享的 httpx 客户端 (首次调用时创建)
+
+    TCP/TLS 连接在所有 Storage 调用间保持复用；安装了 h2 时启用 HTTP/2，
+    列目录、删除、签名等小请求可在同一连接上多路复用。
+    fork 出的子进程应在 fork 之后再调用，不要继承父进程的连接
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                transport = httpx.HTTPTransport(
+                    http2=HTTP2_AVAILABLE,
+                    retries=3,
+                    limits=httpx.Limits(
+                        max_connections=HTTP_POOL_SIZE,
+                        max_keepalive_connections=HTTP_POOL_SIZE,
+                    ),
+                )
+                _http_client = httpx.Client(transport=transport, timeout=HTTP_TIMEOUT)
+    return _http_client
 
 
 class SupabaseStorage:
@@ -15,6 +103,14 @@ class SupabaseStorage:
     DEFAULT_URL = "https://orqthdhhyqtksrtxweoc.supabase.co"
     DEFAULT_BUCKET = "university-files"
     DEFAULT_SIGNED_URL_EXPIRES = 3600  # 签名URL有效期(秒)，默认1小时
+    SIGNED_URL_CACHE_SIZE = 10000      # 签名URL缓存条数上限 (LRU)
+    SIGNED_URL_MIN_REMAINING = 0.9     # 缓存的签名URL剩余有效期须不少于请求有效期的此比例
+    LIST_PAGE_SIZE = 1000              # 列目录分页大小 (SDK 默认只返回前100条)
+    UNCHANGED_CHECK_MIN_SIZE = 1024 * 1024       # 续传比对 ETag 的文件大小下限
+    UNCHANGED_CHECK_MAX_SIZE = 64 * 1024 * 1024  # 续传比对 ETag 的文件大小上限 (避免对超大文件整份算 MD5)
+
+    # 本进程内已确认存在的存储桶 (url, bucket)，所有实例共享
+    _verified_buckets = set()
 
     def __init__(self, url: str = None, key: str = None, bucket: str = None,
                  is_public: bool = False, signed_url_expires: int = None):
@@ -35,17 +131,54 @@ class SupabaseStorage:
         self.signed_url_expires = signed_url_expires or self.DEFAULT_SIGNED_URL_EXPIRES
 
         self.client: Optional[Client] = None
+        self._bucket_api = None
+
+        # 签名URL缓存 {(remote_path, expires_in): (url, 到期时间)}，
+        # 剩余有效期仍满足调用方要求时重复请求不再签名
+        self._signed_url_cache = OrderedDict()
+        self._signed_url_lock = threading.Lock()
 
     def connect(self) -> Client:
         """建立连接"""
         if self.client is None:
             if not self.key:
                 raise ValueError("Supabase key is required. Set SUPABASE_KEY environment variable.")
-            self.client = create_client(self.url, self.key)
+            self.client = self._create_client()
         return self.client
 
+    def _create_client(self) -> Client:
+        """创建 Supabase 客户端，尽量注入共享的 HTTP 连接池"""
+        if ClientOptions is not None:
+            try:
+                options = ClientOptions(httpx_client=get_http_client())
+                return create_client(self.url, self.key, options=options)
+            except TypeError:
+                # SDK 版本不支持 httpx_client 参数，使用其默认连接
+                pass
+        return create_client(self.url, self.key)
+
+    def _auth_headers(self) -> dict:
+        """直接调用 Storage REST 接口时使用的认证头"""
+        return {"Authorization": f"Bearer {self.key}", "apikey": self.key}
+
+    def _bucket(self):
+        """
+        获取存储桶操作对象 (首次调用时创建，之后复用)
+
+        同一实例的所有上传/下载共用一个 Storage 客户端及其底层 HTTP 连接，
+        避免每次调用都重新构造客户端、重新握手
+        """
+        if self._bucket_api is None:
+            self.connect()
+            self._bucket_api = self.client.storage.from_(self.bucket)
+        return self._bucket_api
+
     def ensure_bucket_exists(self):
-        """确保存储桶存在"""
+        """确保存储桶存在 (每个进程只检查一次)"""
+        key = (self.url, self.bucket)
+        if key in self._verified_buckets:
+            return
+
         self.connect()
         try:
             # 尝试获取桶信息
@@ -70,8 +203,10 @@ class SupabaseStorage:
             bucket_type = "公开" if self.is_public else "私有"
             print(f"[Storage] 创建{bucket_type}存储桶: {self.bucket}")
 
+        self._verified_buckets.add(key)
+
     def upload_file(self, local_path: str, remote_path: str,
-                    content_type: str = None) -> str:
+                    content_type: str = None, skip_unchanged: bool = False) -> str:
         """
         上传文件到 Storage
 
@@ -79,6 +214,7 @@ class SupabaseStorage:
             local_path: 本地文件路径
             remote_path: 远程存储路径 (如 "task_123/raw/file.pdf")
             content_type: MIME类型，自动检测如果未指定
+            skip_unchanged: 重试/续传时设为 True，远端已有相同内容则跳过上传
 
         Returns:
             存储路径标识 (bucket/path 格式，用于数据库存储)
@@ -87,23 +223,48 @@ class SupabaseStorage:
 
         # 自动检测 MIME 类型
         if content_type is None:
-            content_type, _ = mimetypes.guess_type(local_path)
-            content_type = content_type or 'application/octet-stream'
-
-        # 读取文件
+            content_type = guess_content_type(local_path)
+
+        # 重试/续传时先比对远端同路径对象的 ETag (内容 MD5)，相同则跳过上传
+        # 仅对一定大小范围内的文件做比对，首次上传不付出额外的 HEAD 和 MD5 开销
+        if skip_unchanged and (self.UNCHANGED_CHECK_MIN_SIZE
+                               <= os.path.getsize(local_path)
+                               <= self.UNCHANGED_CHECK_MAX_SIZE):
+            etag = self._remote_etag(remote_path)
+            if etag and etag == _file_md5(local_path):
+                return self.get_storage_path(remote_path)
+
+        # 直接传入文件对象，由 HTTP 客户端分块读取发送，不整读进内存
         with open(local_path, 'rb') as f:
-            file_data = f.read()
-
-        # 上传
-        response = self.client.storage.from_(self.bucket).upload(
-            path=remote_path,
-            file=file_data,
-            file_options={"content-type": content_type}
-        )
+            response = self._bucket().upload(
+                path=remote_path,
+                file=f,
+                file_options={"content-type": content_type}
+            )
 
         # 返回存储路径标识
         return self.get_storage_path(remote_path)
 
+    def _remote_etag(self, remote_path: str) -> Optional[str]:
+        """
+        获取远端对象的 ETag
+
+        对象不存在、请求失败或为分片上传对象 (ETag 形如 "<md5>-<分片数>"，
+        不是内容 MD5) 时返回 None
+        """
+        self.connect()
+        url = f"{self.url}/storage/v1/object/{self.bucket}/{quote(remote_path)}"
+        try:
+            response = get_http_client().head(url, headers=self._auth_headers())
+        except httpx.HTTPError:
+            return None
+        if response.status_code != 200:
+            return None
+        etag = response.headers.get('etag')
+        if not etag or '-' in etag:
+            return None
+        return etag.strip('"').lower()
+
     def upload_bytes(self, data: bytes, remote_path: str,
                      content_type: str = 'application/octet-stream') -> str:
         """
@@ -119,7 +280,7 @@ class SupabaseStorage:
         """
         self.connect()
 
-        response = self.client.storage.from_(self.bucket).upload(
+        response = self._bucket().upload(
             path=remote_path,
             file=data,
             file_options={"content-type": content_type}
@@ -127,6 +288,36 @@ class SupabaseStorage:
 
         return self.get_storage_path(remote_path)
 
+    def upload_many(self, items: List[Tuple[bytes, str, str]],
+                    max_workers: int = 16) -> List[Optional[str]]:
+        """
+        并发上传多个字节数据到 Storage
+
+        上传耗时主要是网络往返，多线程共用同一个存储桶客户端并发发送
+
+        Args:
+            items: (data, remote_path, content_type) 列表
+            max_workers: 最大并发数
+
+        Returns:
+            与 items 顺序一致的存储路径标识列表，上传失败的位置为 None
+        """
+        if not items:
+            return []
+
+        self._bucket()
+
+        def _upload(item):
+            data, remote_path, content_type = item
+            try:
+                return self.upload_bytes(data, remote_path, content_type)
+            except Exception as e:
+                print(f"[Storage] 上传失败 {remote_path}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            return list(executor.map(_upload, items))
+
     def upload_html(self, html_content: str, remote_path: str) -> str:
         """
         上传HTML内容到 Storage
@@ -157,16 +348,58 @@ class SupabaseStorage:
         """
         self.connect()
 
-        response = self.client.storage.from_(self.bucket).download(remote_path)
-
         # 确保目录存在
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        save_dir = os.path.dirname(local_path) or '.'
+        os.makedirs(save_dir, exist_ok=True)
 
-        with open(local_path, 'wb') as f:
-            f.write(response)
+        # 流式下载，边收边写盘，不在内存中拼出完整文件
+        # 先写入同目录下唯一的 .part 临时文件，完成后再改名，出错时不留下不完整的文件
+        url = f"{self.url}/storage/v1/object/{self.bucket}/{quote(remote_path)}"
+        fd, tmp_path = tempfile.mkstemp(dir=save_dir, prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with get_http_client().stream("GET", url, headers=self._auth_headers()) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.chmod(tmp_path, FILE_MODE)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
         return local_path
 
+    def download_many(self, paths: List[Tuple[str, str]],
+                      max_workers: int = 16) -> List[Optional[str]]:
+        """
+        并发下载多个文件到本地
+
+        各线程共用进程内的 HTTP 连接池 (HTTP_POOL_SIZE 不小于 max_workers)
+
+        Args:
+            paths: (remote_path, local_path) 列表
+            max_workers: 最大并发数
+
+        Returns:
+            与 paths 顺序一致的本地文件路径列表，下载失败的位置为 None
+        """
+        if not paths:
+            return []
+
+        def _download(item):
+            remote_path, local_path = item
+            try:
+                return self.download_file(remote_path, local_path)
+            except Exception as e:
+                print(f"[Storage] 下载失败 {remote_path}: {e}")
+                return None
+
+        max_workers = min(max_workers, HTTP_POOL_SIZE, len(paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_download, paths))
+
     def download_bytes(self, remote_path: str) -> bytes:
         """
         下载文件为字节数据
@@ -178,12 +411,14 @@ class SupabaseStorage:
             文件字节数据
         """
         self.connect()
-        return self.client.storage.from_(self.bucket).download(remote_path)
+        return self._bucket().download(remote_path)
 
     def copy_file(self, source_path: str, dest_path: str) -> str:
         """
         复制文件 (用于重命名)
 
+        使用 Storage 服务端复制接口，文件内容不经过本地
+
         Args:
             source_path: 源路径
             dest_path: 目标路径
@@ -191,20 +426,14 @@ class SupabaseStorage:
         Returns:
             新文件的存储路径标识
         """
-        self.connect()
-
-        # Supabase Storage 不支持直接复制，需要下载再上传
-        data = self.download_bytes(source_path)
-
-        # 获取原文件的 content-type
-        content_type, _ = mimetypes.guess_type(source_path)
-        content_type = content_type or 'application/octet-stream'
-
-        return self.upload_bytes(data, dest_path, content_type)
+        self._bucket().copy(source_path, dest_path)
+        return self.get_storage_path(dest_path)
 
     def move_file(self, source_path: str, dest_path: str) -> str:
         """
-        移动文件 (复制后删除原文件)
+        移动文件
+
+        使用 Storage 服务端移动接口，一次请求完成，不再复制后删除
 
         Args:
             source_path: 源路径
@@ -213,9 +442,8 @@ class SupabaseStorage:
         Returns:
             新文件的存储路径标识
         """
-        storage_path = self.copy_file(source_path, dest_path)
-        self.delete_file(source_path)
-        return storage_path
+        self._bucket().move(source_path, dest_path)
+        return self.get_storage_path(dest_path)
 
     def delete_file(self, remote_path: str) -> bool:
         """
@@ -229,12 +457,35 @@ class SupabaseStorage:
         """
         self.connect()
         try:
-            self.client.storage.from_(self.bucket).remove([remote_path])
+            self._bucket().remove([remote_path])
             return True
         except Exception as e:
             print(f"[Storage] 删除失败: {e}")
             return False
 
+    def delete_files(self, remote_paths: List[str], chunk_size: int = 1000) -> dict:
+        """
+        批量删除文件 (每 chunk_size 个路径一次请求)
+
+        Args:
+            remote_paths: 远程存储路径列表
+            chunk_size: 单次请求删除的最大路径数
+
+        Returns:
+            {'deleted': 成功删除数, 'failed': 删除失败的路径列表}
+        """
+        deleted = 0
+        failed = []
+        for i in range(0, len(remote_paths), chunk_size):
+            chunk = remote_paths[i:i + chunk_size]
+            try:
+                self._bucket().remove(chunk)
+                deleted += len(chunk)
+            except Exception as e:
+                print(f"[Storage] 批量删除失败 ({len(chunk)} 个): {e}")
+                failed.extend(chunk)
+        return {'deleted': deleted, 'failed': failed}
+
     def delete_folder(self, folder_path: str) -> bool:
         """
         删除文件夹及其所有内容
@@ -245,17 +496,16 @@ class SupabaseStorage:
         Returns:
             是否成功
         """
-        self.connect()
         try:
             # 列出文件夹内所有文件
-            files = self.list_files(folder_path)
-            if files:
-                paths = [f"{folder_path}/{f['name']}" for f in files]
-                self.client.storage.from_(self.bucket).remove(paths)
-            return True
+            names = self._list_all_names(folder_path)
         except Exception as e:
             print(f"[Storage] 删除文件夹失败: {e}")
             return False
+        if not names:
+            return True
+        paths = [f"{folder_path}/{name}" for name in names]
+        return not self.delete_files(paths)['failed']
 
     def list_files(self, folder_path: str = "") -> List[dict]:
         """
@@ -267,9 +517,44 @@ class SupabaseStorage:
         Returns:
             文件信息列表
         """
+        return self._list_page(folder_path, limit=100, offset=0)
+
+    def _list_page(self, folder_path: str, limit: int, offset: int) -> List[dict]:
+        """
+        列出文件夹内的一页条目
+
+        直接调用 Storage 的 list 接口，安装了 orjson 时用它编解码，
+        大目录的列表响应解析明显快于标准库 json
+        """
         self.connect()
-        response = self.client.storage.from_(self.bucket).list(folder_path)
-        return response
+        url = f"{self.url}/storage/v1/object/list/{self.bucket}"
+        body = {
+            "prefix": folder_path or "",
+            "limit": limit,
+            "offset": offset,
+            "sortBy": {"column": "name", "order": "asc"},
+        }
+        headers = self._auth_headers()
+        if orjson is not None:
+            headers["Content-Type"] = "application/json"
+            response = get_http_client().post(url, content=orjson.dumps(body), headers=headers)
+            response.raise_for_status()
+            return orjson.loads(response.content)
+
+        response = get_http_client().post(url, json=body, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def _list_all_names(self, folder_path: str) -> List[str]:
+        """分页列出文件夹内全部条目的名称"""
+        names = []
+        offset = 0
+        while True:
+            page = self._list_page(folder_path, self.LIST_PAGE_SIZE, offset)
+            names.extend(f['name'] for f in page)
+            if len(page) < self.LIST_PAGE_SIZE:
+                return names
+            offset += self.LIST_PAGE_SIZE
 
     def get_public_url(self, remote_path: str) -> str:
         """
@@ -282,7 +567,7 @@ class SupabaseStorage:
             公开URL
         """
         self.connect()
-        response = self.client.storage.from_(self.bucket).get_public_url(remote_path)
+        response = self._bucket().get_public_url(remote_path)
         return response
 
     def create_signed_url(self, remote_path: str, expires_in: int = None) -> str:
@@ -296,13 +581,80 @@ class SupabaseStorage:
         Returns:
             签名URL (有时效性)
         """
-        self.connect()
         expires_in = expires_in or self.signed_url_expires
-        response = self.client.storage.from_(self.bucket).create_signed_url(
+        cached = self._get_cached_signed_url(remote_path, expires_in)
+        if cached:
+            return cached
+
+        response = self._bucket().create_signed_url(
             remote_path,
             expires_in
         )
-        return response.get('signedURL') or response.get('signedUrl')
+        url = response.get('signedURL') or response.get('signedUrl')
+        if url:
+            self._cache_signed_url(remote_path, expires_in, url)
+        return url
+
+    def _get_cached_signed_url(self, remote_path: str, expires_in: int) -> Optional[str]:
+        """
+        取缓存的签名URL
+
+        只有剩余有效期不少于 expires_in * SIGNED_URL_MIN_REMAINING 时才复用，
+        保证调用方拿到的 URL 基本满足其要求的有效期
+        """
+        key = (remote_path, expires_in)
+        with self._signed_url_lock:
+            cached = self._signed_url_cache.get(key)
+            if cached is None:
+                return None
+            url, expires_at = cached
+            if expires_at - time.time() < expires_in * self.SIGNED_URL_MIN_REMAINING:
+                del self._signed_url_cache[key]
+                return None
+            self._signed_url_cache.move_to_end(key)
+            return url
+
+    def _cache_signed_url(self, remote_path: str, expires_in: int, url: str):
+        """缓存签名URL及其到期时间"""
+        key = (remote_path, expires_in)
+        expires_at = time.time() + expires_in
+        with self._signed_url_lock:
+            self._signed_url_cache[key] = (url, expires_at)
+            self._signed_url_cache.move_to_end(key)
+            while len(self._signed_url_cache) > self.SIGNED_URL_CACHE_SIZE:
+                self._signed_url_cache.popitem(last=False)
+
+    def create_signed_urls(self, remote_paths: List[str], expires_in: int = None) -> dict:
+        """
+        批量创建签名URL (一次请求)
+
+        Args:
+            remote_paths: 远程存储路径列表
+            expires_in: 有效期(秒)，默认使用 self.signed_url_expires
+
+        Returns:
+            {remote_path: 签名URL}，签名失败的路径不在结果中
+        """
+        expires_in = expires_in or self.signed_url_expires
+
+        signed_urls = {}
+        missing = []
+        for path in remote_paths:
+            cached = self._get_cached_signed_url(path, expires_in)
+            if cached:
+                signed_urls[path] = cached
+            else:
+                missing.append(path)
+        if not missing:
+            return signed_urls
+
+        response = self._bucket().create_signed_urls(missing, expires_in)
+        for item in response:
+            url = item.get('signedURL') or item.get('signedUrl')
+            if url and not item.get('error'):
+                signed_urls[item['path']] = url
+                self._cache_signed_url(item['path'], expires_in, url)
+        return signed_urls
 
     def get_url(self, remote_path: str, expires_in: int = None) -> str:
         """
@@ -342,16 +694,48 @@ class SupabaseStorage:
         Returns:
             是否存在
         """
-        self.connect()
+        bucket = self._bucket()
         try:
-            # 尝试获取文件信息
+            if hasattr(bucket, 'exists'):
+                # 对对象地址发 HEAD 请求，不用列出整个目录
+                return bucket.exists(remote_path)
+
+            # 旧版本 SDK 无 exists，按文件名过滤列目录
             folder = os.path.dirname(remote_path)
             filename = os.path.basename(remote_path)
-            files = self.list_files(folder)
+            files = bucket.list(folder, {"search": filename})
             return any(f['name'] == filename for f in files)
         except Exception:
             return False
 
+    def exists_many(self, remote_paths: List[str]) -> Dict[str, bool]:
+        """
+        批量检查文件是否存在
+
+        按所在目录分组，每个目录只列一次，再在名称集合中查找；
+        同一目录下路径较多时比逐个 file_exists 的请求少得多
+
+        Args:
+            remote_paths: 远程存储路径列表
+
+        Returns:
+            {remote_path: 是否存在}
+        """
+        paths_by_dir = defaultdict(list)
+        for path in remote_paths:
+            folder, _, name = path.rpartition('/')
+            paths_by_dir[folder].append((path, name))
+
+        result = {}
+        for folder, entries in paths_by_dir.items():
+            try:
+                names = set(self._list_all_names(folder))
+            except Exception:
+                names = set()
+            for path, name in entries:
+                result[path] = name in names
+        return result
+
 
 # 测试代码
 if __name__ == "__main__":
@@ -4,6 +4,7 @@
 """
 
 from typing import List, Tuple, Dict
+from collections import OrderedDict
 from dataclasses import dataclass
 import hashlib
 
@@ -24,6 +25,11 @@ class SyncResult:
 class IncrementalSync:
     """增量同步检测器"""
 
+    # 每次送往目标库比对的源链接数量，内存中同时只保留一批
+    DIFF_BATCH_SIZE = 5000
+    # URL 哈希缓存条数上限 (LRU)，超出后淘汰最久未用的条目，内存占用不随源库规模增长
+    URL_HASH_CACHE_SIZE = 100000
+
     def __init__(self, source_db: SourceDatabase = None, target_db: TargetDatabase = None):
         """
         初始化同步器
@@ -35,47 +41,90 @@ class IncrementalSync:
         self.source_db = source_db or SourceDatabase()
         self.target_db = target_db or TargetDatabase()
 
-    def detect_new_links(self) -> List[LinkRecord]:
-        """
-        检测未爬取的新链接
+        # {source_link_id: (url, url_hash)}，多轮检测间复用，URL 未变的链接不再重复计算哈希
+        self._url_hash_cache: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
 
-        Returns:
-            新链接列表
+    def _url_hash(self, link: LinkRecord) -> str:
         """
-        # 获取源数据库所有link ID
-        all_links = self.source_db.get_all_links()
-        all_source_ids = {link.id for link in all_links}
+        计算链接 URL 的哈希，命中缓存且 URL 未变时直接复用
 
-        # 获取目标数据库已存在的source_link_id
-        existing_ids = set(self.target_db.get_all_task_source_ids())
+        哈希算法须与 TargetDatabase.create_task 写入的 url_hash 一致（MD5），
+        更换算法会让所有已有任务被判定为变更
+        """
+        cache = self._url_hash_cache
+        cached = cache.get(link.id)
+        if cached is not None and cached[0] == link.url:
+            cache.move_to_end(link.id)
+            return cached[1]
+
+        url_hash = hashlib.md5(link.url.encode()).hexdigest()
+        cache[link.id] = (link.url, url_hash)
+        cache.move_to_end(link.id)
+        if len(cache) > self.URL_HASH_CACHE_SIZE:
+            cache.popitem(last=False)
+        return url_hash
+
+    def _detect_new_and_changed(self, link_type: str = None) -> Tuple[List[LinkRecord], List[LinkRecord]]:
+        """
+        流式检测新增和 URL 变更的链接
 
-        # 找出差集
-        new_ids = all_source_ids - existing_ids
+        源链接通过服务端游标分批读取，每批计算 URL 哈希后在目标库一次查询比对，
+        只保留新增和变更的记录，不在内存中保留完整的源链接列表和哈希字典。
+        URL 哈希经有上限的缓存复用，见 _url_hash
 
-        # 返回新链接
-        return [link for link in all_links if link.id in new_ids]
+        Args:
+            link_type: 筛选类型 (undergraduate/graduate)，None 表示全部
 
-    def detect_changed_links(self) -> List[LinkRecord]:
+        Returns:
+            (新增链接列表, 变更链接列表)
         """
-        检测URL变更的链接
+        new_links, changed_links = [], []
+        batch: Dict[int, LinkRecord] = {}
+
+        def flush():
+            new_ids, changed_ids = self.target_db.diff_against_source({
+                link_id: self._url_hash(link)
+                for link_id, link in batch.items()
+            })
+            new_links.extend(batch[link_id] for link_id in new_ids)
+            changed_links.extend(batch[link_id] for link_id in changed_ids)
+            batch.clear()
+
+        for link in self.source_db.iter_links(link_type, batch_size=self.DIFF_BATCH_SIZE):
+            batch[link.id] = link
+            if len(batch) >= self.DIFF_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+        # 保持源库中的 id 顺序
+        new_links.sort(key=lambda link: link.id)
+        changed_links.sort(key=lambda link: link.id)
+        return new_links, changed_links
+
+    def detect_new_links(self, link_type: str = None) -> List[LinkRecord]:
+        """
+        检测未爬取的新链接
+
+        Args:
+            link_type: 筛选类型 (undergraduate/graduate)，None 表示全部
 
         Returns:
-            变更的链接列表
+            新链接列表
         """
-        # 获取所有源链接
-        all_links = self.source_db.get_all_links()
+        return self._detect_new_and_changed(link_type)[0]
 
-        # 构建 {source_link_id: url_hash} 字典
-        url_hashes = {
-            link.id: hashlib.md5(link.url.encode()).hexdigest()
-            for link in all_links
-        }
+    def detect_changed_links(self, link_type: str = None) -> List[LinkRecord]:
+        """
+        检测URL变更的链接
 
-        # 检测变更
-        changed_ids = self.target_db.get_changed_tasks(url_hashes)
+        Args:
+            link_type: 筛选类型 (undergraduate/graduate)，None 表示全部
 
-        # 返回变更的链接
-        return [link for link in all_links if link.id in changed_ids]
+        Returns:
+            变更的链接列表
+        """
+        return self._detect_new_and_changed(link_type)[1]
 
     def detect_failed_tasks(self) -> List[TaskRecord]:
         """
@@ -86,12 +135,13 @@ class IncrementalSync:
         """
         return self.target_db.get_tasks_by_status('failed')
 
-    def run_detection(self, include_failed: bool = True) -> SyncResult:
+    def run_detection(self, include_failed: bool = True, link_type: str = None) -> SyncResult:
         """
         运行完整的增量检测
 
         Args:
             include_failed: 是否包含失败任务的重试
+            link_type: 筛选类型 (undergraduate/graduate)，None 表示全部
 
         Returns:
             SyncResult 检测结果
@@ -106,12 +156,9 @@ class IncrementalSync:
         total_source = self.source_db.get_total_count()
         print(f"[Sync] 源数据总数: {total_source}")
 
-        # 检测新增
-        new_links = self.detect_new_links()
+        # 检测新增和变更：流式读取源链接，分批在目标库比对
+        new_links, changed_links = self._detect_new_and_changed(link_type)
         print(f"[Sync] 新增链接: {len(new_links)}")
-
-        # 检测变更
-        changed_links = self.detect_changed_links()
         print(f"[Sync] 变更链接: {len(changed_links)}")
 
         # 检测失败
@@ -142,7 +189,8 @@ class IncrementalSync:
     def get_pending_links(self, include_failed: bool = True,
                           include_changed: bool = True,
                           link_type: str = None,
-                          deduplicate: bool = True) -> List[LinkRecord]:
+                          deduplicate: bool = True,
+                          limit: int = None) -> List[LinkRecord]:
         """
         获取所有待处理的链接（合并新增、变更、失败）
 
@@ -151,49 +199,56 @@ class IncrementalSync:
             include_changed: 是否包含变更重爬
             link_type: 筛选类型 (undergraduate/graduate/vocational)
             deduplicate: 是否按URL去重（默认True）
+            limit: 最多返回的链接数，None 表示全部
 
         Returns:
             待处理的LinkRecord列表
         """
-        result = self.run_detection(include_failed=include_failed)
+        result = self.run_detection(include_failed=include_failed, link_type=link_type)
 
-        # 合并所有待处理链接
+        # 合并所有待处理链接（按 id 去重，集合查找 O(1)）
         pending_links = list(result.new_links)
+        seen_ids = {link.id for link in pending_links}
+
+        def merge(links):
+            for link in links:
+                if link.id not in seen_ids:
+                    seen_ids.add(link.id)
+                    pending_links.append(link)
 
         if include_changed:
             # 变更的链接直接添加
-            for link in result.changed_links:
-                if link not in pending_links:
-                    pending_links.append(link)
+            merge(result.changed_links)
 
         if include_failed:
             # 失败任务需要通过source_link_id获取对应的LinkRecord
             failed_source_ids = [task.source_link_id for task in result.failed_tasks]
             if failed_source_ids:
-                failed_links = self.source_db.get_links_by_ids(failed_source_ids)
-                for link in failed_links:
-                    if link not in pending_links:
-                        pending_links.append(link)
-
-        # 类型筛选
-        if link_type:
-            pending_links = [link for link in pending_links if link.table_name == link_type]
+                merge(self.source_db.get_links_by_ids(failed_source_ids))
 
+        # 类型筛选与 URL 去重合并为一次遍历
+        # 类型筛选：新增/变更已在 SQL 中筛选，这里处理失败重试的链接
         # URL 去重：相同 URL 只保留第一条
-        if deduplicate:
-            before_count = len(pending_links)
-            seen_urls = set()
-            unique_links = []
-            for link in pending_links:
-                if link.url not in seen_urls:
-                    seen_urls.add(link.url)
-                    unique_links.append(link)
-            pending_links = unique_links
-            duplicates_removed = before_count - len(pending_links)
-            if duplicates_removed > 0:
-                print(f"[Sync] URL去重: 移除 {duplicates_removed} 个重复链接")
+        seen_urls = set()
+        unique_links = []
+        duplicates_removed = 0
+        for link in pending_links:
+            if link_type and link.table_name != link_type:
+                continue
+            if deduplicate:
+                if link.url in seen_urls:
+                    duplicates_removed += 1
+                    continue
+                seen_urls.add(link.url)
+            unique_links.append(link)
+        if duplicates_removed > 0:
+            print(f"[Sync] URL去重: 移除 {duplicates_removed} 个重复链接")
+        pending_links = unique_links
 
         print(f"[Sync] 待处理链接总数: {len(pending_links)}")
+
+        if limit:
+            pending_links = pending_links[:limit]
         return pending_links
 
     def prepare_task_for_link(self, link: LinkRecord) -> int:
@@ -223,6 +278,43 @@ class IncrementalSync:
         print(f"[Sync] 创建任务: source_link_id={link.id} -> task_id={task_id}")
         return task_id
 
+    def prepare_tasks_for_links(self, links: List[LinkRecord]) -> Dict[int, int]:
+        """
+        批量为链接准备任务记录
+
+        与逐条调用 prepare_task_for_link 效果相同，但旧数据清理、学校名称查询、
+        任务创建各只需一次（学校名称按表各一次）数据库往返
+
+        Args:
+            links: 链接记录列表
+
+        Returns:
+            {source_link_id: task_id}
+        """
+        if not links:
+            return {}
+
+        # 清理变更/失败重试任务的旧数据（ON DELETE CASCADE 一并删除节点和文件）
+        removed = self.target_db.delete_tasks_by_source_ids([link.id for link in links])
+        if removed:
+            print(f"[Sync] 清理旧任务数据: {removed} 个任务")
+
+        # 按表批量获取学校名称
+        row_ids_by_table: Dict[str, List[int]] = {}
+        for link in links:
+            row_ids_by_table.setdefault(link.table_name, []).append(link.row_id)
+        school_names = {
+            table_name: self.source_db.get_school_names(table_name, row_ids)
+            for table_name, row_ids in row_ids_by_table.items()
+        }
+
+        task_ids = self.target_db.batch_create_tasks([
+            (link.id, link.url, school_names[link.table_name].get(link.row_id))
+            for link in links
+        ])
+        print(f"[Sync] 批量创建任务: {len(task_ids)} 个")
+        return task_ids
+
     def close(self):
         """关闭数据库连接"""
         self.source_db.close()